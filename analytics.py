@@ -0,0 +1,264 @@
+"""
+Offline analytics over StoryWeaver session history
+Streams progress JSON files, the progress store and sessions CSV exports in
+chunks, re-scores practice attempts with the current scoring engine across
+a process pool, and writes columnar summaries as Parquet:
+
+- child_trends.parquet: per child and day, sessions, sections, attempts and
+  accuracy
+- error_type_improvement.parquet: per error type and ISO week, accuracy and
+  its change since the first week that error type was seen
+- subject_difficulty.parquet: per picture subject, accuracy, pass rate and
+  attempts per section
+
+Workers return partial aggregates rather than per-attempt rows, and only a
+few chunks are in flight at a time, so memory stays bounded by the number
+of distinct children, days, error types and subjects, not by the number
+of attempts.
+
+Usage:
+    python analytics.py --progress progress_data.json --store --csv data/sessions.csv --out analytics_out
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from collections import defaultdict
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import config
+import profiles
+import progress_store
+import scoring
+
+
+def _new_stats():
+    return {'sessions': 0, 'attempts': 0, 'accuracy_sum': 0.0, 'passed': 0,
+            'rescored': 0, 'sections': 0, 'error_occurrences': 0}
+
+
+class Aggregates:
+    """Running sums keyed by (child, day), (error type, week) and subject"""
+
+    def __init__(self):
+        self.child_day = defaultdict(_new_stats)
+        self.error_week = defaultdict(_new_stats)
+        self.subject = defaultdict(_new_stats)
+
+    def merge(self, other):
+        for mine, theirs in ((self.child_day, other.child_day),
+                             (self.error_week, other.error_week),
+                             (self.subject, other.subject)):
+            for key, stats in theirs.items():
+                target = mine[key]
+                for name, value in stats.items():
+                    target[name] += value
+
+
+def score_chunk(items, threshold):
+    """Re-score one chunk of attempts and return its partial aggregates
+
+    Each item is (profile, day, week, subject, error_types, reference,
+    transcript, stored_accuracy). Attempts saved without their section text
+    cannot be re-scored and keep their stored accuracy.
+    """
+    aggregates = Aggregates()
+
+    for profile, day, week, subject, error_types, reference, transcript, stored_accuracy in items:
+        rescored = bool(reference)
+        accuracy = scoring.score(reference, transcript)['accuracy'] if rescored else stored_accuracy
+        buckets = [aggregates.child_day[(profile, day)], aggregates.subject[subject]]
+        buckets += [aggregates.error_week[(error_type, week)] for error_type in error_types]
+        for stats in buckets:
+            stats['attempts'] += 1
+            stats['accuracy_sum'] += accuracy
+            stats['passed'] += accuracy >= threshold
+            stats['rescored'] += rescored
+    return aggregates
+
+
+def iter_sources(progress_files, store_path, use_store):
+    """Yield sessions from every configured source without loading them whole"""
+    for path in progress_files:
+        yield from progress_store.iter_json_sessions(path)
+    if use_store and store_path:
+        yield from progress_store.ProgressStore(store_path).iter_sessions()
+    elif use_store:
+        # Every child's shard, one after another
+        for _, session in progress_store.ShardedProgressStore().iter_sessions():
+            yield session
+
+
+def iter_csv_sessions(path):
+    """Yield (timestamp, error types) rows from a sessions CSV export"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            try:
+                errors = json.loads(row.get('errors') or "[]")
+            except json.JSONDecodeError:
+                errors = []
+            types = [err.get('error_type') or err.get('type') or "unknown" for err in errors if isinstance(err, dict)]
+            yield row.get('timestamp', ''), types
+
+
+def run(progress_files=(), csv_files=(), use_store=False, store_path=None, workers=None,
+        chunk_size=5000, threshold=None):
+    """Stream every source through the worker pool and return the merged aggregates"""
+    threshold = threshold if threshold is not None else config.ACCURACY_THRESHOLD
+    workers = workers or os.cpu_count() or 1
+    totals = Aggregates()
+    chunk = []
+    pending = set()
+
+    def collect(block):
+        done, still_pending = wait(pending, return_when=FIRST_COMPLETED if block else ALL_COMPLETED)
+        for future in done:
+            totals.merge(future.result())
+        return still_pending
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for session in iter_sources(progress_files, store_path, use_store):
+            profile = session.get('profile_id') or profiles.DEFAULT_PROFILE
+            day, week = _day_and_week(session.get('date', ''))
+            subject = session.get('subject') or "unknown"
+            error_types = tuple(sorted({err.get('type', 'unknown') for err in session.get('errors_detail') or []}))
+            sections = len(session.get('section_attempts') or {})
+
+            buckets = [totals.child_day[(profile, day)], totals.subject[subject]]
+            buckets += [totals.error_week[(error_type, week)] for error_type in error_types]
+            for stats in buckets:
+                stats['sessions'] += 1
+                stats['sections'] += sections
+            for err in session.get('errors_detail') or []:
+                totals.error_week[(err.get('type', 'unknown'), week)]['error_occurrences'] += 1
+
+            for attempts in (session.get('section_attempts') or {}).values():
+                for attempt in attempts:
+                    chunk.append((profile, day, week, subject, error_types, attempt.get('reference'),
+                                  attempt.get('transcript', ''), float(attempt.get('accuracy', 0) or 0)))
+
+            if len(chunk) >= chunk_size:
+                pending.add(pool.submit(score_chunk, chunk, threshold))
+                chunk = []
+                # Bound memory: never hold more than two chunks per worker in flight
+                while len(pending) >= 2 * workers:
+                    pending = collect(block=True)
+
+        if chunk:
+            pending.add(pool.submit(score_chunk, chunk, threshold))
+        if pending:
+            collect(block=False)
+
+    for path in csv_files:
+        for timestamp, types in iter_csv_sessions(path):
+            _, week = _day_and_week(timestamp)
+            for error_type in types:
+                totals.error_week[(error_type, week)]['error_occurrences'] += 1
+
+    return totals
+
+
+def summary_tables(aggregates):
+    """Turn the aggregates into three column dicts ready for Arrow"""
+    child = _columns(["profile_id", "day"], aggregates.child_day)
+
+    error = _columns(["error_type", "week"], aggregates.error_week)
+    first_week = {}
+    for error_type, week, mean in zip(error["error_type"], error["week"], error["mean_accuracy"]):
+        if mean is not None and (error_type not in first_week or week < first_week[error_type][0]):
+            first_week[error_type] = (week, mean)
+    error["change_since_first_week"] = [
+        None if mean is None or error_type not in first_week else mean - first_week[error_type][1]
+        for error_type, mean in zip(error["error_type"], error["mean_accuracy"])
+    ]
+
+    subject = _columns(["subject"], aggregates.subject)
+    subject["attempts_per_section"] = [
+        attempts / sections if sections else None
+        for attempts, sections in zip(subject["attempts"], subject["sections"])
+    ]
+    return {
+        "child_trends": child,
+        "error_type_improvement": error,
+        "subject_difficulty": subject,
+    }
+
+
+def write_parquet(tables, out_dir):
+    """Write each summary table to `out_dir`/<name>.parquet"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("pyarrow is required for Parquet output: pip install pyarrow")
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, columns in tables.items():
+        path = os.path.join(out_dir, f"{name}.parquet")
+        pq.write_table(pa.table(columns), path)
+        paths.append(path)
+    return paths
+
+
+def _columns(key_names, stats_by_key):
+    columns = {name: [] for name in key_names}
+    for name in ("sessions", "attempts", "rescored", "mean_accuracy", "pass_rate", "sections", "error_occurrences"):
+        columns[name] = []
+    for key in sorted(stats_by_key):
+        stats = stats_by_key[key]
+        key = key if isinstance(key, tuple) else (key,)
+        for name, value in zip(key_names, key):
+            columns[name].append(value)
+        attempts = stats['attempts']
+        columns["sessions"].append(stats['sessions'])
+        columns["attempts"].append(attempts)
+        columns["rescored"].append(stats['rescored'])
+        columns["mean_accuracy"].append(stats['accuracy_sum'] / attempts if attempts else None)
+        columns["pass_rate"].append(stats['passed'] / attempts if attempts else None)
+        columns["sections"].append(stats['sections'])
+        columns["error_occurrences"].append(stats['error_occurrences'])
+    return columns
+
+
+def _day_and_week(value):
+    try:
+        moment = datetime.fromisoformat(value.strip().replace(" ", "T", 1))
+    except ValueError:
+        return "unknown", "unknown"
+    year, week, _ = moment.isocalendar()
+    return moment.date().isoformat(), f"{year}-W{week:02d}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score and summarise StoryWeaver session history")
+    parser.add_argument("--progress", nargs="*", default=[], help="Progress JSON files to read")
+    parser.add_argument("--csv", nargs="*", default=[], help="sessions.csv exports to read")
+    parser.add_argument("--store", action="store_true", help="Also read the progress store (every profile's shard)")
+    parser.add_argument("--db", default=None, help="Read only this progress store file with --store")
+    parser.add_argument("--out", default="analytics_out", help="Directory for the Parquet files")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Attempts per scoring task")
+    args = parser.parse_args()
+
+    if not (args.progress or args.csv or args.store):
+        parser.error("give at least one of --progress, --csv or --store")
+
+    aggregates = run(args.progress, args.csv, args.store, args.db, args.workers, args.chunk_size)
+    for path in write_parquet(summary_tables(aggregates), args.out):
+        print(path)
+
+    # Every attempt counts once per subject, so these are the overall totals
+    attempts = sum(stats['attempts'] for stats in aggregates.subject.values())
+    rescored = sum(stats['rescored'] for stats in aggregates.subject.values())
+    print(f"Re-scored {rescored} of {attempts} attempts with the current scoring engine")
+    if rescored < attempts:
+        print(f"{attempts - rescored} attempts were saved without their section text and keep the "
+              f"accuracy stored with them; their 'rescored' count is 0")
+
+
+if __name__ == "__main__":
+    main()
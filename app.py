@@ -1,27 +1,26 @@
 import streamlit as st
-import random
-import os
-import whisper
-import json
-import pandas as pd
-import google.generativeai as genai
-from dotenv import load_dotenv
 from st_audiorec import st_audiorec
 import time
-from gtts import gTTS
-import base64
+import uuid
 from datetime import datetime
-from difflib import SequenceMatcher
 
-# Load environment variables for API key
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+import asr_service
+import config
+import llm
+import picture_catalog
+import practice
+import profiles
+import progress_store
+import startup
+import telemetry
+import tts
 
-# Load Whisper model once
-whisper_model = whisper.load_model("base")
+# Whisper (or the ASR worker pool), the audio decoder and the LLM client load
+# on a background thread shared by every session, so the page renders at once
+warmup = startup.get_warmup()
 
-PICTURE_FOLDER = "pictures"
-PROGRESS_FILE = "progress_data.json"
+# Stage timings go to the metrics file (and /metrics when TELEMETRY_PORT is set)
+telemetry.get_telemetry()
 
 # Initialize session state
 if 'stage' not in st.session_state:
@@ -44,145 +43,199 @@ if 'section_attempts' not in st.session_state:
     st.session_state.section_attempts = {}
 if 'session_start' not in st.session_state:
     st.session_state.session_start = datetime.now()
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+if 'progress_saved' not in st.session_state:
+    st.session_state.progress_saved = False
+if 'recent_subjects' not in st.session_state:
+    st.session_state.recent_subjects = []
+if 'practice_checks' not in st.session_state:
+    st.session_state.practice_checks = {}  # audio hash -> practice.Check
+if 'section_views' not in st.session_state:
+    st.session_state.section_views = {}  # section index -> (highlighted html, focus words)
+if 'profile_id' not in st.session_state:
+    st.session_state.profile_id = profiles.DEFAULT_PROFILE
+if 'session_profile_id' not in st.session_state:
+    st.session_state.session_profile_id = profiles.DEFAULT_PROFILE  # the child this story belongs to
+if 'history_pages' not in st.session_state:
+    st.session_state.history_pages = [None]  # cursors of the history pages viewed, newest first
+
+telemetry.set_session(st.session_state.session_id)
 
 def get_random_picture():
-    pictures = os.listdir(PICTURE_FOLDER)
-    if not pictures:
+    """Pick a picture from the catalog, avoiding subjects this child just saw"""
+    picture = picture_catalog.get_catalog().choose(st.session_state.recent_subjects)
+    if picture is None:
         return None, ""
-    idx = random.randint(0, len(pictures) - 1)
-    picture_file = pictures[idx]
-    subject = os.path.splitext(picture_file)[0]
-    return picture_file, subject
-
-def detect_errors(transcript):
-    prompt = f"""
-You are a speech therapist helping a child aged 4-6 years. 
-Analyze the following child's sentence for errors:
-
-\"{transcript}\"
-
-Identify:
-1. Grammar errors and corrections
-2. Vocabulary errors and corrections
-3. Simple articulation errors that can be inferred from the text
-
-Return a JSON array. Each element must include:
-- type: "grammar" or "vocabulary" or "articulation"
-- incorrect: the incorrect phrase
-- correction: the corrected phrase
-- explanation: short child-friendly explanation (max 15 words)
-
-Return ONLY the JSON array (empty if no errors).
-"""
+    recent = st.session_state.recent_subjects + [picture.subject]
+    st.session_state.recent_subjects = recent[-config.PICTURE_RECENT_SUBJECTS:] if config.PICTURE_RECENT_SUBJECTS > 0 else []
+    return picture.file, picture.subject
 
+def analyze_transcript(subject, transcript):
+    """Detect errors and generate the practice story via the LLM pipeline"""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        
-        response_text = response.text.strip()
-        
-        if response_text.startswith('```'):
-            lines = response_text.split('\n')
-            response_text = '\n'.join(lines[1:-1])
-            if response_text.startswith('json'):
-                response_text = response_text[4:].strip()
-        
-        return json.loads(response_text)
-    except json.JSONDecodeError as e:
-        st.error(f"Error parsing AI response as JSON: {e}")
-        return []
+        with telemetry.span("llm_pipeline", transcript_chars=len(transcript)) as span:
+            result = llm.run_pipeline(subject, transcript)
+            span.set(mode=result['mode'], round_trips=result['round_trips'], errors=len(result['errors']))
     except Exception as e:
         st.error(f"Error calling AI: {e}")
-        return []
+        return [], ""
+    for issue in result['issues']:
+        st.error(issue)
+    return result['errors'], result['story']
 
-def generate_story(subject, errors, transcript):
-    if not errors or len(errors) == 0:
-        error_description = "No specific errors were detected, so create a simple engaging story."
-    else:
-        error_list = []
-        for err in errors:
-            error_list.append(f"- {err.get('type', 'error')}: '{err.get('incorrect', '')}' should be '{err.get('correction', '')}'")
-        error_description = "The child made these errors:\n" + "\n".join(error_list)
-    
-    prompt = f"""
-You are a creative children's story writer and speech therapist.
+def text_to_speech(text):
+    """Return spoken audio bytes for text, served from the shared TTS cache"""
+    try:
+        with telemetry.span("text_to_speech", text_chars=len(text)):
+            return tts.get_cache().get(text, lang='en', slow=False)
+    except Exception as e:
+        st.error(f"Error in text-to-speech: {e}")
+        return None
 
-Create a SHORT story (3 sentences) for a 4-6 year old child about: {subject}
+def transcribe_audio(audio_bytes):
+    """Transcribe recorder WAV bytes for the picture description"""
+    try:
+        # Normally loaded long before the child finishes speaking
+        asr_backend = warmup.result('asr')
+    except Exception as e:
+        st.error(f"Speech recognition is not available: {e}")
+        st.stop()
+    try:
+        result = practice.recognize(audio_bytes, asr_backend)
+    except practice.NoSpeech:
+        st.warning("I couldn't hear any words. Let's try again, a little louder!")
+        st.stop()
+    except asr_service.ASRQueueFull:
+        st.error("Lots of children are practicing right now. Please try again in a moment!")
+        st.stop()
+    return result
 
-IMPORTANT REQUIREMENTS:
-1. The story MUST naturally incorporate and repeatedly use the words/sounds the child struggled with
-2. Make the story engaging, fun, and age-appropriate, and mostly with simple words adapted for young children.
-3. {error_description}
-4. Use simple vocabulary but strategically include the correction words from the errors
-5. Break the story into very short sections (1-2 sentences each) separated by a pipe symbol |
+def section_view(index):
+    """Highlighted html and focus words for a story section, computed once
 
-The child said: "{transcript}"
+    The section's speech is queued in the TTS cache at the same time, so
+    preparing the next line while the child reads this one makes both
+    "Listen" and the highlighting instant when they move on.
+    """
+    if index not in st.session_state.section_views:
+        text = st.session_state.story_sections[index]
+        st.session_state.section_views[index] = practice.highlight(text, st.session_state.errors)
+        tts.get_cache().prefetch([text])
+    return st.session_state.section_views[index]
 
-Generate the story with sections separated by | (pipe symbol).
-Example format: "Once upon a time, there was a happy dog. | The dog loved to play. | One day, the dog found a ball."
+def practice_check(audio_bytes, section, reference, focus_words):
+    """The check for this recording, started in the background on first sight
 
-Return ONLY the story text with | separators, no other commentary.
-"""
+    Returns None for a recording already checked against an earlier
+    section: the recorder keeps returning its last clip after "Next Line".
+    """
+    key = practice.audio_key(audio_bytes)
+    check = st.session_state.practice_checks.get(key)
+    if check is None:
+        check = practice.check(audio_bytes, section, reference, focus_words, lambda: warmup.result('asr'))
+        st.session_state.practice_checks[key] = check
+    return check if check.section == section else None
 
-    try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        story = response.text.strip()
-        
-        if story.startswith('```'):
-            lines = story.split('\n')
-            story = '\n'.join(lines[1:-1])
-        
-        return story
-    except Exception as e:
-        st.error(f"Error generating story: {e}")
-        return ""
+def wait_for_check(check):
+    """Show progress for a running check and rerun the page once it finishes"""
+    if check.done():
+        st.rerun()
+    heard = f" I heard: *{check.partial}* ..." if check.partial else ""
+    st.info(f"Checking your reading...{heard}")
+    if not hasattr(st, "fragment"):
+        # No fragments on this Streamlit version: poll by rerunning the page
+        time.sleep(config.PRACTICE_POLL_SECONDS)
+        st.rerun()
 
-def text_to_speech(text, filename="temp_audio.mp3"):
-    try:
-        tts = gTTS(text=text, lang='en', slow=False)
-        tts.save(filename)
-        return filename
-    except Exception as e:
-        st.error(f"Error in text-to-speech: {e}")
-        return None
+# Poll just this part of the page instead of rerunning the whole script
+if hasattr(st, "fragment"):
+    wait_for_check = st.fragment(run_every=config.PRACTICE_POLL_SECONDS)(wait_for_check)
 
-def calculate_accuracy(original, spoken):
-    """Calculate similarity between original text and spoken text"""
-    original = original.lower().strip()
-    spoken = spoken.lower().strip()
-    return SequenceMatcher(None, original, spoken).ratio() * 100
+def record_attempt(check, section_key, transcript, accuracy):
+    """Add a finished check to the session's attempts, once per recording"""
+    if check.recorded:
+        return
+    st.session_state.section_attempts.setdefault(section_key, []).append({
+        'reference': check.reference,
+        'transcript': transcript,
+        'accuracy': accuracy,
+        'timestamp': datetime.now().isoformat()
+    })
+    check.recorded = True
 
 def save_progress(session_data):
-    """Save session progress to JSON file"""
+    """Commit session progress to the child's progress shard (once per session id)"""
     try:
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                data = json.load(f)
-        else:
-            data = {"sessions": []}
-        
-        data["sessions"].append(session_data)
-        
-        with open(PROGRESS_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        with telemetry.span("save_progress", attempts=session_data.get('total_attempts', 0)):
+            progress_store.get_shards().commit_session(session_data)
+        return True
     except Exception as e:
         st.error(f"Error saving progress: {e}")
+        return False
 
-def load_progress():
-    """Load progress data from JSON file"""
+def load_progress(profile_id, before=None):
+    """Load one child's running totals and one page of their sessions (newest first)"""
     try:
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                return json.load(f)
-        return {"sessions": []}
+        store = progress_store.get_store(profile_id)
+        progress_data = store.summary()
+        progress_data["sessions"], progress_data["next_page"] = store.page(config.PROGRESS_PAGE_SIZE, before)
+        return progress_data
     except Exception as e:
         st.error(f"Error loading progress: {e}")
-        return {"sessions": []}
+        return {"total_sessions": 0, "average_accuracy": 0, "sessions": [], "next_page": None}
+
+def add_profile(therapist_id):
+    """Create the child typed into "Add a child", select them and clear the field"""
+    name = st.session_state.new_profile_name
+    if not name.strip():
+        return
+    profile = profiles.get_registry().create(name, therapist_id=therapist_id)
+    st.session_state.profile_id = profile['profile_id']
+    st.session_state.history_pages = [None]
+    st.session_state.new_profile_name = ""
+
+def choose_profile():
+    """Sidebar picker for the child practicing; their sessions are saved to their profile"""
+    registry = profiles.get_registry()
+    # A story in progress belongs to the child who started it
+    locked = st.session_state.stage == 'story_generated' and not st.session_state.progress_saved
+    therapist_id = None
+    therapists, _ = registry.page(kind="therapist", limit=config.PROFILE_PAGE_SIZE)
+    if therapists:
+        therapist = st.selectbox("Therapist", [None] + therapists, disabled=locked,
+                                 format_func=lambda p: "All children" if p is None else p['name'])
+        therapist_id = therapist['profile_id'] if therapist else None
+    search = st.text_input("Find a child", placeholder="Start of a name", disabled=locked)
+    # Only one page of names is read, however many children share this host
+    children, more = registry.page("child", therapist_id, search, limit=config.PROFILE_PAGE_SIZE)
+    current = registry.get(st.session_state.profile_id)
+    if current is not None and all(p['profile_id'] != current['profile_id'] for p in children):
+        children = [current] + children
+    if more:
+        st.caption(f"Showing the first {config.PROFILE_PAGE_SIZE} names; type to narrow the list.")
+
+    ids = [p['profile_id'] for p in children]
+    names = {p['profile_id']: p['name'] for p in children}
+    if ids:
+        selected = st.selectbox("Child", ids, format_func=names.get, disabled=locked,
+                                index=ids.index(st.session_state.profile_id) if st.session_state.profile_id in ids else 0)
+        if selected != st.session_state.profile_id:
+            st.session_state.profile_id = selected
+            st.session_state.history_pages = [None]
+
+    if locked:
+        st.caption("Finish this story to switch child.")
+        return
+    with st.expander("Add a child"):
+        name = st.text_input("Name", key="new_profile_name")
+        st.button("Add", disabled=not name.strip(), on_click=add_profile, args=(therapist_id,))
 
 def display_error_table(errors):
     """Display error table in a formatted way"""
     if errors and len(errors) > 0:
+        import pandas as pd
+
         df = pd.DataFrame(errors)
         required_cols = ["type", "incorrect", "correction", "explanation"]
         available_cols = [col for col in required_cols if col in df.columns]
@@ -193,25 +246,44 @@ def display_error_table(errors):
     else:
         st.info("No errors detected in this session")
 
+def show_readiness():
+    """Sidebar caption saying which models are still loading"""
+    status = warmup.status()
+    failed = [startup.LABELS[name] for name, info in status.items() if info['state'] == "failed"]
+    loading = [startup.LABELS[name] for name, info in status.items() if info['state'] in ("waiting", "loading")]
+    if failed:
+        st.caption(f"⚠️ Could not load: {', '.join(failed)}")
+    if loading:
+        st.caption(f"⏳ Getting ready: {', '.join(loading)}...")
+    elif not failed:
+        st.caption("🟢 Ready")
+
+# Re-check every second while loading on Streamlit versions with fragments
+if hasattr(st, "fragment") and not warmup.ready():
+    show_readiness = st.fragment(run_every=1)(show_readiness)
+
 # Main UI
 st.title("Child Speech Therapy Assistant")
 
 # Sidebar for progress tracking
 with st.sidebar:
+    show_readiness()
+    choose_profile()
     st.header("Progress Tracking")
-    progress_data = load_progress()
+    progress_data = load_progress(st.session_state.profile_id, st.session_state.history_pages[-1])
     
-    if progress_data["sessions"]:
-        st.metric("Total Sessions", len(progress_data["sessions"]))
-        
-        # Calculate average accuracy
-        accuracies = [s.get("average_accuracy", 0) for s in progress_data["sessions"]]
-        avg_accuracy = sum(accuracies) / len(accuracies) if accuracies else 0
-        st.metric("Average Accuracy", f"{avg_accuracy:.1f}%")
+    if progress_data["total_sessions"]:
+        st.metric("Total Sessions", progress_data["total_sessions"])
+        st.metric("Average Accuracy", f"{progress_data['average_accuracy']:.1f}%")
+        st.metric(
+            f"Last {progress_data['recent_sessions']} Sessions",
+            f"{progress_data['recent_average_accuracy']:.1f}%",
+            delta=f"{progress_data['recent_average_accuracy'] - progress_data['average_accuracy']:.1f}%"
+        )
         
-        # Show recent sessions
+        # Show recent sessions, one page at a time
         st.subheader("Recent Sessions")
-        for i, session in enumerate(reversed(progress_data["sessions"][-5:])):
+        for i, session in enumerate(progress_data["sessions"]):
             with st.expander(f"📅 {session.get('date', 'Unknown')}"):
                 st.write(f"**Subject:** {session.get('subject', 'N/A')}")
                 st.write(f"**Accuracy:** {session.get('average_accuracy', 0):.1f}%")
@@ -224,6 +296,16 @@ with st.sidebar:
                     st.markdown("**Error Details:**")
                     error_details = session.get('errors_detail', [])
                     display_error_table(error_details)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(st.session_state.history_pages) > 1 and st.button("Newer", use_container_width=True):
+                st.session_state.history_pages.pop()
+                st.rerun()
+        with col2:
+            if progress_data["next_page"] is not None and st.button("Older", use_container_width=True):
+                st.session_state.history_pages.append(progress_data["next_page"])
+                st.rerun()
     else:
         st.info("No sessions yet. Start practicing!")
 
@@ -234,11 +316,12 @@ st.markdown("---")
 if st.session_state.stage == 'description':
     st.header("Describe the Picture")
     
-    if st.session_state.picture_file is None:
+    # A picture removed from the folder mid-session is replaced by a new one
+    if st.session_state.picture_file is None or picture_catalog.get_catalog().get(st.session_state.picture_file) is None:
         st.session_state.picture_file, st.session_state.picture_subject = get_random_picture()
     
     if st.session_state.picture_file:
-        st.image(os.path.join(PICTURE_FOLDER, st.session_state.picture_file), 
+        st.image(picture_catalog.get_catalog().image_bytes(st.session_state.picture_file), 
                 caption=f"What do you see?", width=400)
         st.info(f"Picture: {st.session_state.picture_subject.title()}")
     else:
@@ -252,21 +335,20 @@ if st.session_state.stage == 'description':
     if audio_bytes is not None:
         st.audio(audio_bytes, format="audio/wav")
         
-        audio_path = "child_description.wav"
-        with open(audio_path, "wb") as f:
-            f.write(audio_bytes)
-        
         st.success("✅ Audio recorded!")
         
         with st.spinner("Understanding what you said..."):
-            whisper_result = whisper_model.transcribe(audio_path)
+            whisper_result = transcribe_audio(audio_bytes)
             st.session_state.transcript = whisper_result.get("text", "").strip()
         
         st.markdown(f"**You said:** *{st.session_state.transcript}*")
         
         if st.session_state.transcript:
-            with st.spinner("Checking for improvements..."):
-                st.session_state.errors = detect_errors(st.session_state.transcript)
+            with st.spinner("Checking for improvements and creating your practice story..."):
+                st.session_state.errors, st.session_state.story = analyze_transcript(
+                    st.session_state.picture_subject,
+                    st.session_state.transcript
+                )
             
             if st.session_state.errors and len(st.session_state.errors) > 0:
                 st.subheader("Let's work on these:")
@@ -274,21 +356,16 @@ if st.session_state.stage == 'description':
             else:
                 st.success("Perfect! Great speaking!")
             
-            # Automatically generate story
-            with st.spinner("Creating your practice story..."):
-                st.session_state.story = generate_story(
-                    st.session_state.picture_subject,
-                    st.session_state.errors,
-                    st.session_state.transcript
-                )
-                
-                if st.session_state.story:
-                    st.session_state.story_sections = [s.strip() for s in st.session_state.story.split('|') if s.strip()]
-                    st.session_state.stage = 'story_generated'
-                    st.session_state.current_section = 0
-                    st.session_state.section_attempts = {}
-                    time.sleep(1)
-                    st.rerun()
+            if st.session_state.story:
+                st.session_state.story_sections = [s.strip() for s in st.session_state.story.split('|') if s.strip()]
+                # Synthesize every section now so "Listen" is instant later
+                tts.get_cache().prefetch(st.session_state.story_sections)
+                st.session_state.stage = 'story_generated'
+                st.session_state.session_profile_id = st.session_state.profile_id
+                st.session_state.current_section = 0
+                st.session_state.section_attempts = {}
+                st.session_state.section_views = {}
+                st.rerun()
 
 # Stage 2: Story Display and Practice
 elif st.session_state.stage == 'story_generated':
@@ -327,17 +404,10 @@ elif st.session_state.stage == 'story_generated':
         st.caption(f"Section {st.session_state.current_section + 1} of {len(st.session_state.story_sections)}")
         
         # Highlight error words in current section
-        highlighted_text = current_text
-        error_words = []
-        if st.session_state.errors:
-            for err in st.session_state.errors:
-                correction = err.get('correction', '').lower()
-                if correction and correction in current_text.lower():
-                    error_words.append(correction)
-                    highlighted_text = highlighted_text.replace(
-                        correction,
-                        f'<span style="background-color: #ffeb3b; font-weight: bold; padding: 2px 4px; border-radius: 3px;">{correction}</span>'
-                    )
+        highlighted_text, error_words = section_view(st.session_state.current_section)
+        # While the child reads this line, get the next one ready
+        if st.session_state.current_section + 1 < len(st.session_state.story_sections):
+            section_view(st.session_state.current_section + 1)
         
         # Display current section
         st.markdown(
@@ -358,9 +428,9 @@ elif st.session_state.stage == 'story_generated':
         col1, col2 = st.columns(2)
         with col1:
             if st.button("Listen", key=f"listen_{section_key}", use_container_width=True):
-                audio_file = text_to_speech(current_text, f"{section_key}.mp3")
-                if audio_file:
-                    st.audio(audio_file)
+                audio_data = text_to_speech(current_text)
+                if audio_data:
+                    st.audio(audio_data, format=tts.get_cache().backend.mime_type)
         
         with col2:
             st.markdown("**Now you read it!**")
@@ -369,34 +439,46 @@ elif st.session_state.stage == 'story_generated':
         st.markdown("### Record yourself reading this line:")
         practice_audio = st_audiorec()
         
+        # Whisper and scoring run on the practice pool; this page only polls
+        check = None
         if practice_audio is not None:
+            check = practice_check(practice_audio, st.session_state.current_section, current_text, error_words)
+        
+        if check is not None and not check.done():
+            st.audio(practice_audio, format="audio/wav")
+            wait_for_check(check)
+        elif check is not None:
             st.audio(practice_audio, format="audio/wav")
+            practice_result = check.result()
             
-            practice_path = f"practice_{section_key}.wav"
-            with open(practice_path, "wb") as f:
-                f.write(practice_audio)
+            if practice_result['status'] == "no_speech":
+                st.warning("I couldn't hear any words. Let's try again, a little louder!")
+                st.stop()
+            if practice_result['status'] == "busy":
+                st.error("Lots of children are practicing right now. Please try again in a moment!")
+                st.stop()
+            if practice_result['status'] == "error":
+                st.error(f"Error checking your reading: {practice_result['error']}")
+                st.stop()
             
-            with st.spinner("Checking your reading..."):
-                practice_result = whisper_model.transcribe(practice_path)
-                practice_transcript = practice_result.get("text", "").strip()
+            practice_transcript = practice_result['transcript']
+            reading_score = practice_result['score']
+            accuracy = reading_score['accuracy']
             
             st.markdown(f"**You said:** *{practice_transcript}*")
             
-            # Calculate accuracy
-            accuracy = calculate_accuracy(current_text, practice_transcript)
+            if reading_score['missed_words']:
+                st.caption(f"Words to practice: {', '.join(dict.fromkeys(reading_score['missed_words']))}")
+            if reading_score['focus_scores']:
+                st.caption("Focus words: " + ", ".join(
+                    f"{word} {word_score:.0f}%" for word, word_score in reading_score['focus_scores'].items()
+                ))
             
             # Store attempt
-            if section_key not in st.session_state.section_attempts:
-                st.session_state.section_attempts[section_key] = []
-            
-            st.session_state.section_attempts[section_key].append({
-                'transcript': practice_transcript,
-                'accuracy': accuracy,
-                'timestamp': datetime.now().isoformat()
-            })
+            record_attempt(check, section_key, practice_transcript, accuracy)
             
             # Show accuracy
-            if accuracy >= 80:
+            if accuracy >= config.ACCURACY_THRESHOLD:
                 st.success(f"🌟 Excellent! Accuracy: {accuracy:.1f}%")
                 if st.button("➡️ Next Line", type="primary", use_container_width=True):
                     st.session_state.current_section += 1
@@ -444,6 +526,8 @@ elif st.session_state.stage == 'story_generated':
         
         # Save progress
         session_data = {
+            'session_id': st.session_state.session_id,
+            'profile_id': st.session_state.session_profile_id,
             'date': st.session_state.session_start.strftime("%Y-%m-%d %H:%M:%S"),
             'subject': st.session_state.picture_subject,
             'initial_errors': len(st.session_state.errors),
@@ -453,7 +537,9 @@ elif st.session_state.stage == 'story_generated':
             'average_accuracy': avg_accuracy,
             'section_attempts': st.session_state.section_attempts
         }
-        save_progress(session_data)
+        # This screen reruns on every interaction; only the first run writes
+        if not st.session_state.progress_saved:
+            st.session_state.progress_saved = save_progress(session_data)
         
         # Show detailed progress
         st.markdown("### 📈 Detailed Progress")
@@ -467,6 +553,8 @@ elif st.session_state.stage == 'story_generated':
             })
         
         if progress_df:
+            import pandas as pd
+
             st.dataframe(pd.DataFrame(progress_df), use_container_width=True)
         
         # Reset button
@@ -480,5 +568,9 @@ elif st.session_state.stage == 'story_generated':
             st.session_state.story_sections = []
             st.session_state.current_section = 0
             st.session_state.section_attempts = {}
+            st.session_state.practice_checks = {}
+            st.session_state.section_views = {}
             st.session_state.session_start = datetime.now()
+            st.session_state.session_id = uuid.uuid4().hex
+            st.session_state.progress_saved = False
             st.rerun()
\ No newline at end of file
@@ -0,0 +1,326 @@
+"""
+Speech recognition helpers for StoryWeaver
+Keeps a process-wide registry of Whisper models so Streamlit reruns and
+concurrent sessions share one loaded copy instead of reloading from disk.
+The model comes from a pluggable backend: openai-whisper (PyTorch) or
+faster-whisper (CTranslate2, int8 on CPU); every backend returns an object
+whose `transcribe(audio, **kwargs)` has openai-whisper's result shape.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Whisper models work on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+_models = {}
+_load_stats = {}
+_registry_lock = threading.Lock()
+
+
+class SerializedModel:
+    """An openai-whisper model shared by threads, decoding one clip at a time
+
+    Each decode installs kv-cache hooks on the shared decoder modules, so
+    two decodes running at once would write into each other's caches.
+    Every other attribute is the wrapped model's.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+
+    def transcribe(self, audio, **kwargs):
+        with self._lock:
+            return self.model.transcribe(audio, **kwargs)
+
+    def decode(self, mel, options=None):
+        with self._lock:
+            return self.model.decode(mel, options) if options is not None else self.model.decode(mel)
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+
+def load_whisper(name, compute_type=None, threads=None):
+    """openai-whisper on PyTorch; `threads` caps torch's intra-op thread pool"""
+    import whisper
+
+    threads = threads if threads is not None else config.ASR_THREADS
+    if threads > 0:
+        import torch
+        torch.set_num_threads(threads)
+    if compute_type not in (None, "default", "float32"):
+        logger.warning("The whisper backend ignores compute type %r; use faster-whisper for int8", compute_type)
+    return SerializedModel(whisper.load_model(name))
+
+
+class FasterWhisperModel:
+    """faster-whisper (CTranslate2) on CPU, usually with int8 weights
+
+    Uses a fraction of the memory of the PyTorch model and decodes several
+    times faster per core. Results are converted to openai-whisper's shape
+    so callers do not need to know which backend is loaded.
+    """
+
+    # Options both libraries understand the same way
+    PASSTHROUGH = ("language", "task", "beam_size", "best_of", "temperature", "initial_prompt",
+                   "condition_on_previous_text", "no_speech_threshold")
+
+    def __init__(self, name, compute_type=None, threads=None):
+        from faster_whisper import WhisperModel
+
+        self.name = name
+        self.compute_type = compute_type or config.ASR_COMPUTE_TYPE
+        threads = threads if threads is not None else config.ASR_THREADS
+        # cpu_threads=0 lets CTranslate2 pick its default
+        self.model = WhisperModel(name, device="cpu", compute_type=self.compute_type, cpu_threads=max(threads, 0))
+
+    def transcribe(self, audio, **kwargs):
+        options = {key: kwargs[key] for key in self.PASSTHROUGH if key in kwargs}
+        # openai-whisper decodes greedily by default; faster-whisper would use a beam of 5
+        options.setdefault("beam_size", 1)
+        segments, info = self.model.transcribe(audio, **options)
+        segments = [{'start': seg.start, 'end': seg.end, 'text': seg.text} for seg in segments]
+        return {'text': "".join(seg['text'] for seg in segments), 'segments': segments, 'language': info.language}
+
+
+BACKENDS = {
+    "whisper": load_whisper,
+    "faster-whisper": FasterWhisperModel,
+}
+
+
+def register_backend(name, factory):
+    """Make a recognizer available as config.ASR_BACKEND=`name`
+
+    `factory(model_name, compute_type=None, threads=None)` must return an
+    object with a whisper-style `transcribe(audio, **kwargs)`.
+    """
+    BACKENDS[name] = factory
+
+
+def current_rss_mb():
+    """Return the resident memory of this process in MB (None if unknown)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except (ImportError, OSError):
+        return None
+
+
+def get_model(name=None, backend=None):
+    """Return the Whisper model `name`, loading it at most once per process"""
+    name = name or config.WHISPER_MODEL
+    backend = backend or config.ASR_BACKEND
+    key = (backend, name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        # Another session may have finished loading while we waited
+        if key not in _models:
+            if backend not in BACKENDS:
+                raise ValueError(f"Unknown ASR backend {backend!r}; expected one of {sorted(BACKENDS)}")
+
+            rss_before = current_rss_mb()
+            start = time.perf_counter()
+            _models[key] = BACKENDS[backend](name)
+            load_seconds = time.perf_counter() - start
+            rss_after = current_rss_mb()
+
+            _load_stats[key] = {
+                'model': name,
+                'backend': backend,
+                'load_seconds': load_seconds,
+                'rss_before_mb': rss_before,
+                'rss_after_mb': rss_after,
+                'rss_delta_mb': (rss_after - rss_before) if None not in (rss_before, rss_after) else None,
+                'pid': os.getpid(),
+            }
+            logger.info("Loaded %s model %r in %.2fs (rss %s MB)",
+                        backend, name, load_seconds, _format_mb(rss_after))
+    return _models[key]
+
+
+def warm_up(name=None, backend=None):
+    """Load the model and run one tiny decode so the first real request is fast"""
+    import numpy as np
+
+    model = get_model(name, backend)
+    key = (backend or config.ASR_BACKEND, name or config.WHISPER_MODEL)
+
+    start = time.perf_counter()
+    # One second of silence
+    model.transcribe(np.zeros(SAMPLE_RATE, dtype=np.float32), fp16=False)
+    warmup_seconds = time.perf_counter() - start
+
+    with _registry_lock:
+        _load_stats[key]['warmup_seconds'] = warmup_seconds
+        _load_stats[key]['rss_after_warmup_mb'] = current_rss_mb()
+    logger.info("Warmed %s model %r in %.2fs", key[0], key[1], warmup_seconds)
+    return model
+
+
+def load_stats(name=None, backend=None):
+    """Return load time and memory figures for loaded models
+
+    With `name`, returns that model's stats for `backend` (default
+    config.ASR_BACKEND), or None if it is not loaded; otherwise returns a
+    dict of stats for every loaded model keyed by "backend/name".
+    """
+    with _registry_lock:
+        if name is not None:
+            stats = _load_stats.get((backend or config.ASR_BACKEND, name))
+            return dict(stats) if stats else None
+        return {f"{key[0]}/{key[1]}": dict(value) for key, value in _load_stats.items()}
+
+
+def loaded_models():
+    """Return (backend, model name) pairs currently held in the registry"""
+    return list(_models)
+
+
+def load_audio(path):
+    """Decode an audio file into the 16 kHz float32 array Whisper expects"""
+    import whisper
+    return whisper.load_audio(path)
+
+
+class StreamingTranscriber:
+    """Incrementally transcribe audio that arrives in chunks
+
+    Audio is decoded in overlapping windows of `window_seconds`, advancing
+    every `step_seconds` of new audio, and `on_partial(text)` is called with
+    the transcript so far. `finalize()` decodes only audio fed since the
+    last window: a clip that fits in one window gets the same result as a
+    one-shot `model.transcribe()`, a longer one is stitched together from the
+    segments of its windows rather than decoded again. A clip that is already
+    complete gains nothing from windows; transcribe it in one call instead.
+    """
+
+    def __init__(self, model=None, window_seconds=None, step_seconds=None, on_partial=None, **transcribe_kwargs):
+        self.model = model if model is not None else get_model()
+        self.window = int((window_seconds or config.ASR_STREAM_WINDOW_SECONDS) * SAMPLE_RATE)
+        self.step = max(1, int((step_seconds or config.ASR_STREAM_STEP_SECONDS) * SAMPLE_RATE))
+        self.on_partial = on_partial
+        self.transcribe_kwargs = transcribe_kwargs
+        self.partial_text = ""
+        self._chunks = []
+        self._length = 0
+        self._decoded_until = 0
+        self._last_result = None
+        self._last_offset = 0.0
+        self._committed = []
+
+    def feed(self, samples):
+        """Append new audio samples and decode any windows that became ready"""
+        import numpy as np
+
+        samples = np.asarray(samples, dtype=np.float32).ravel()
+        if samples.size:
+            self._chunks.append(samples)
+            self._length += samples.size
+
+        # A large chunk (e.g. a finished upload) is walked window by window
+        while self._length - self._decoded_until >= self.step:
+            end = min(self._length, self._decoded_until + self.window)
+            self._decode_window(end)
+        return self.partial_text
+
+    def finalize(self):
+        """Return the final Whisper result for everything fed so far"""
+        if self._last_result is None or self._decoded_until < self._length:
+            self._decode_window(self._length)
+        if self._length <= self.window:
+            return self._last_result
+
+        segments = self._committed + self._live_segments(self._last_result, self._last_offset)
+        return {
+            'text': "".join(seg["text"] for seg in segments),
+            'segments': segments,
+            'language': self._last_result.get("language"),
+        }
+
+    def _buffer(self):
+        import numpy as np
+
+        if not self._chunks:
+            return np.zeros(0, dtype=np.float32)
+        if len(self._chunks) > 1:
+            self._chunks = [np.concatenate(self._chunks)]
+        return self._chunks[0]
+
+    def _decode_window(self, end):
+        start = max(0, end - self.window)
+        offset = start / SAMPLE_RATE
+        result = self.model.transcribe(self._buffer()[start:end], **self.transcribe_kwargs)
+
+        # Segments of the previous window that end before this window starts
+        # will never be revised again, so they become committed text
+        if self._last_result is not None:
+            for seg in self._last_result.get("segments", []):
+                seg_start = seg["start"] + self._last_offset
+                seg_end = seg["end"] + self._last_offset
+                if seg_end <= offset and seg_start >= self._committed_end():
+                    self._committed.append(dict(seg, start=seg_start, end=seg_end))
+
+        live = self._live_segments(result, offset)
+        self.partial_text = "".join(seg["text"] for seg in self._committed + live).strip()
+        self._last_result = result
+        self._last_offset = offset
+        self._decoded_until = end
+
+        if self.on_partial is not None:
+            self.on_partial(self.partial_text)
+
+    def _live_segments(self, result, offset):
+        """Segments of a window decode that start after the committed text, in clip time"""
+        segments = result.get("segments")
+        if segments is None:
+            return [{"start": offset, "end": self._length / SAMPLE_RATE, "text": result.get("text", "")}]
+        committed_end = self._committed_end()
+        return [dict(seg, start=seg["start"] + offset, end=seg["end"] + offset)
+                for seg in segments if seg["start"] + offset >= committed_end]
+
+    def _committed_end(self):
+        return self._committed[-1]["end"] if self._committed else 0.0
+
+
+def _format_mb(value):
+    return "?" if value is None else f"{value:.0f}"
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Load a Whisper model and report load time and memory")
+    parser.add_argument("--model", default=config.WHISPER_MODEL, help="Whisper model size (default: config.WHISPER_MODEL)")
+    parser.add_argument("--backend", default=config.ASR_BACKEND, choices=sorted(BACKENDS),
+                        help="Recognizer backend (default: config.ASR_BACKEND)")
+    parser.add_argument("--warmup", action="store_true", help="Also run a short warm-up decode")
+    args = parser.parse_args()
+
+    if args.warmup:
+        warm_up(args.model, args.backend)
+    else:
+        get_model(args.model, args.backend)
+    print(json.dumps(load_stats(args.model, args.backend), indent=2))
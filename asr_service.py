@@ -0,0 +1,416 @@
+"""
+Batched speech recognition service for StoryWeaver
+Runs Whisper in a pool of worker processes fed by a shared request queue.
+Each worker gathers pending clips from many sessions into one padded batch
+and decodes them in a single forward pass. Clips whose greedy decode fails
+transcribe()'s quality checks are decoded again with its temperature
+fallback, so results match a plain `model.transcribe()`.
+"""
+
+import atexit
+import itertools
+import logging
+import multiprocessing
+import queue
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import asr
+import config
+
+logger = logging.getLogger(__name__)
+
+# Whisper decodes fixed 30 second windows; longer clips use the full transcribe loop
+_MAX_BATCH_SAMPLES = 30 * asr.SAMPLE_RATE
+
+# transcribe() options a padded batch reproduces; any other option (a prompt,
+# beam search, fixed temperature) sends the clip through transcribe() itself
+_BATCH_KWARGS = {"language", "task", "fp16", "verbose"}
+
+# transcribe()'s defaults for retrying a decode at higher temperature and
+# for dropping windows that are silence
+_COMPRESSION_RATIO_THRESHOLD = 2.4
+_LOGPROB_THRESHOLD = -1.0
+_NO_SPEECH_THRESHOLD = 0.6
+
+# Seconds per Whisper timestamp token
+_TIME_PRECISION = 0.02
+
+# How often the result collector checks that the workers are still running
+_WORKER_CHECK_SECONDS = 1.0
+
+_service = None
+_service_lock = threading.Lock()
+
+
+class ASRQueueFull(RuntimeError):
+    """Raised when the request queue stays full for longer than the submit timeout"""
+
+
+class ASRService:
+    """Pool of Whisper worker processes behind a bounded request queue
+
+    `transcribe(audio)` has the same shape as `whisper_model.transcribe` and
+    returns a dict with the recognised `text`, plus `metrics` holding the
+    queue wait, decode time and batch size for that request.
+    """
+
+    def __init__(self, workers=None, model_name=None, max_batch_size=None,
+                 max_batch_delay=None, queue_size=None, submit_timeout=None, backend=None):
+        self.workers = workers or config.ASR_WORKERS
+        self.model_name = model_name or config.WHISPER_MODEL
+        self.backend = backend or config.ASR_BACKEND
+        self.max_batch_size = max_batch_size or config.ASR_MAX_BATCH_SIZE
+        self.max_batch_delay = max_batch_delay if max_batch_delay is not None else config.ASR_MAX_BATCH_DELAY_MS / 1000
+        self.submit_timeout = submit_timeout if submit_timeout is not None else config.ASR_SUBMIT_TIMEOUT
+
+        # spawn keeps the workers free of Streamlit's threads and torch state
+        ctx = multiprocessing.get_context("spawn")
+        self.queue_size = queue_size or config.ASR_QUEUE_SIZE
+        self._requests = ctx.Queue(maxsize=self.queue_size)
+        self._results = ctx.Queue()
+        self._ids = itertools.count()
+        self._pending = {}
+        # Request id -> index of the worker decoding it
+        self._owners = {}
+        self._exited = set()
+        self._pending_lock = threading.Lock()
+        self._metrics = deque(maxlen=1000)
+        self._closed = False
+
+        self._processes = [
+            ctx.Process(
+                target=_worker_main,
+                args=(i, self._requests, self._results, self.model_name, self.backend,
+                      self.max_batch_size, self.max_batch_delay, config.WHISPER_WARMUP),
+                daemon=True,
+                name=f"asr-worker-{i}",
+            )
+            for i in range(self.workers)
+        ]
+        for process in self._processes:
+            process.start()
+
+        self._collector = threading.Thread(target=self._collect_results, name="asr-results", daemon=True)
+        self._collector.start()
+
+    def submit(self, audio, **transcribe_kwargs):
+        """Queue a 16 kHz float32 clip and return a Future for its result"""
+        import numpy as np
+
+        if self._closed:
+            raise RuntimeError("ASR service has been shut down")
+
+        request_id = next(self._ids)
+        future = Future()
+        with self._pending_lock:
+            self._pending[request_id] = future
+
+        item = {
+            'id': request_id,
+            'audio': np.asarray(audio, dtype=np.float32).ravel(),
+            'kwargs': transcribe_kwargs,
+            'enqueued_at': time.time(),
+        }
+        try:
+            self._requests.put(item, timeout=self.submit_timeout)
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise ASRQueueFull(f"ASR queue is full ({self.queue_size} pending requests)")
+        return future
+
+    def transcribe(self, audio, timeout=None, **transcribe_kwargs):
+        """Submit a clip and block until its transcript is ready"""
+        future = self.submit(audio, **transcribe_kwargs)
+        return future.result(timeout=timeout if timeout is not None else config.ASR_REQUEST_TIMEOUT)
+
+    def recent_metrics(self):
+        """Return the per-request metrics of recently completed requests"""
+        return list(self._metrics)
+
+    def metrics_summary(self):
+        """Summarise queue wait and decode time over recent requests"""
+        records = list(self._metrics)
+        if not records:
+            return {'requests': 0}
+        waits = [r['queue_wait_seconds'] for r in records]
+        decodes = [r['decode_seconds'] for r in records]
+        return {
+            'requests': len(records),
+            'mean_queue_wait_seconds': statistics.fmean(waits),
+            'max_queue_wait_seconds': max(waits),
+            'mean_decode_seconds': statistics.fmean(decodes),
+            'max_decode_seconds': max(decodes),
+            'mean_batch_size': statistics.fmean(r['batch_size'] for r in records),
+            'queued': self.queue_depth(),
+        }
+
+    def queue_depth(self):
+        """Approximate number of requests waiting for a worker"""
+        try:
+            return self._requests.qsize()
+        except NotImplementedError:
+            # qsize() is not available on macOS
+            return None
+
+    def shutdown(self):
+        """Stop the workers and fail any requests still in flight"""
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._processes:
+            try:
+                self._requests.put(None, timeout=1)
+            except queue.Full:
+                break
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._owners.clear()
+        for future in pending.values():
+            future.set_exception(RuntimeError("ASR service shut down"))
+
+    def _collect_results(self):
+        while True:
+            try:
+                message = self._results.get(timeout=_WORKER_CHECK_SECONDS)
+            except queue.Empty:
+                message = {}
+            if message is None:
+                return
+            if message:
+                self._handle(message)
+            # Checked after every message too: results from the other workers
+            # must not keep a crashed worker's requests waiting
+            self._check_workers()
+
+    def _check_workers(self):
+        """Fail the requests of workers that died instead of waiting out their timeout"""
+        if self._closed:
+            return
+        dead = {i for i, process in enumerate(self._processes)
+                if i not in self._exited and not process.is_alive()}
+        if not dead:
+            return
+
+        # Results a worker sent just before it died still count
+        while True:
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if message is None:
+                self._results.put(None)
+                break
+            self._handle(message)
+
+        for i in dead:
+            logger.error("ASR worker %s exited with code %s", i, self._processes[i].exitcode)
+        self._exited |= dead
+        # Without any worker, queued requests would never be picked up either
+        stopped = len(self._exited) == len(self._processes)
+        with self._pending_lock:
+            lost = [request_id for request_id in self._pending
+                    if stopped or self._owners.get(request_id) in dead]
+            futures = [self._pending.pop(request_id) for request_id in lost]
+            for request_id in lost:
+                self._owners.pop(request_id, None)
+        if stopped:
+            self._closed = True
+        for future in futures:
+            future.set_exception(RuntimeError("ASR worker exited before finishing this request"))
+
+    def _handle(self, message):
+        if 'claimed' in message:
+            with self._pending_lock:
+                for request_id in message['claimed']:
+                    if request_id in self._pending:
+                        self._owners[request_id] = message['worker']
+            return
+
+        with self._pending_lock:
+            future = self._pending.pop(message['id'], None)
+            self._owners.pop(message['id'], None)
+        if future is None:
+            return
+        if 'error' in message:
+            future.set_exception(RuntimeError(message['error']))
+            return
+
+        metrics = message['metrics']
+        self._metrics.append(metrics)
+        result = dict(message['result'])
+        result['metrics'] = metrics
+        future.set_result(result)
+
+
+def get_service():
+    """Return the process-wide ASR service, starting its workers on first use"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = ASRService()
+                atexit.register(_service.shutdown)
+    return _service
+
+
+def _worker_main(index, requests, results, model_name, backend, max_batch_size, max_batch_delay, warmup):
+    model = asr.warm_up(model_name, backend) if warmup else asr.get_model(model_name, backend)
+
+    while True:
+        first = requests.get()
+        if first is None:
+            return
+
+        # Hold the batch open briefly so clips from other sessions can join it
+        batch = [first]
+        deadline = time.monotonic() + max_batch_delay
+        stop = False
+        while len(batch) < max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+                break
+            batch.append(item)
+
+        # Tell the service which requests die with this worker if it crashes
+        results.put({'claimed': [item['id'] for item in batch], 'worker': index})
+        started_at = time.time()
+        for item in batch:
+            item['queue_wait_seconds'] = started_at - item['enqueued_at']
+        _process_batch(model, batch, results, padded=backend == "whisper")
+
+        if stop:
+            return
+
+
+def _process_batch(model, batch, results, padded=True):
+    # Only the PyTorch model exposes the mel/decode API used for padded batches
+    def batchable(item):
+        return padded and len(item['audio']) <= _MAX_BATCH_SAMPLES and set(item['kwargs']) <= _BATCH_KWARGS
+
+    groups = {}
+    single = []
+    for item in batch:
+        if not batchable(item):
+            single.append(item)
+            continue
+        kwargs = item['kwargs']
+        key = (kwargs.get('language'), kwargs.get('task', 'transcribe'), kwargs.get('fp16', True))
+        groups.setdefault(key, []).append(item)
+
+    for (language, task, fp16), items in groups.items():
+        start = time.perf_counter()
+        try:
+            decoded = _decode_padded(model, [item['audio'] for item in items], language, task, fp16)
+        except Exception:
+            # One bad clip must not fail the whole batch; transcribe() reports it alone
+            logger.exception("Batched decode failed, transcribing its %d clips one by one", len(items))
+            single.extend(items)
+            continue
+        decode_seconds = time.perf_counter() - start
+        for item, result in zip(items, decoded):
+            if _needs_fallback(result):
+                single.append(item)
+                continue
+            results.put(_message(item, _batched_result(model, result, item['audio'], task),
+                                 decode_seconds, len(items)))
+
+    for item in single:
+        start = time.perf_counter()
+        try:
+            result = model.transcribe(item['audio'], **item['kwargs'])
+        except Exception as e:
+            logger.exception("Transcription failed")
+            results.put({'id': item['id'], 'error': str(e)})
+            continue
+        result = {'text': result.get('text', ''), 'segments': result.get('segments', []),
+                  'language': result.get('language')}
+        results.put(_message(item, result, time.perf_counter() - start, 1))
+
+
+def _decode_padded(model, clips, language, task, fp16=True):
+    """Greedily decode up to 30 s clips as one padded mel batch in a single forward pass"""
+    import torch
+    import whisper
+
+    mels = torch.stack([
+        whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(clip)), n_mels=model.dims.n_mels)
+        for clip in clips
+    ]).to(model.device)
+    options = whisper.DecodingOptions(language=language, task=task, temperature=0.0,
+                                      fp16=fp16 and model.device.type == "cuda")
+    return model.decode(mels, options)
+
+
+def _needs_fallback(result):
+    """Whether transcribe() would have retried this decode at a higher temperature"""
+    if result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob < _LOGPROB_THRESHOLD:
+        # Silence; transcribe() keeps the greedy decode and drops it
+        return False
+    return result.compression_ratio > _COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < _LOGPROB_THRESHOLD
+
+
+def _batched_result(model, result, clip, task):
+    """transcribe()'s result dict for one greedy decode, split into timestamped segments"""
+    from whisper.tokenizer import get_tokenizer
+
+    if result.no_speech_prob > _NO_SPEECH_THRESHOLD and result.avg_logprob <= _LOGPROB_THRESHOLD:
+        return {'text': "", 'segments': [], 'language': result.language}
+
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=result.language, task=task)
+    duration = len(clip) / asr.SAMPLE_RATE
+    segments, text_tokens, start = [], [], 0.0
+    # The trailing None closes the last segment at the end of the clip
+    for token in list(result.tokens) + [None]:
+        is_timestamp = token is not None and token >= tokenizer.timestamp_begin
+        if token is not None and not is_timestamp:
+            text_tokens.append(token)
+            continue
+        end = (token - tokenizer.timestamp_begin) * _TIME_PRECISION if is_timestamp else duration
+        if text_tokens:
+            segments.append({
+                'id': len(segments),
+                'seek': 0,
+                'start': start,
+                'end': max(start, end),
+                'text': tokenizer.decode(text_tokens),
+                'tokens': text_tokens,
+                'temperature': 0.0,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob,
+            })
+            text_tokens = []
+        start = end
+    return {'text': "".join(segment['text'] for segment in segments), 'segments': segments,
+            'language': result.language}
+
+
+def _message(item, result, decode_seconds, batch_size):
+    return {
+        'id': item['id'],
+        'result': result,
+        'metrics': {
+            'queue_wait_seconds': item['queue_wait_seconds'],
+            'decode_seconds': decode_seconds,
+            'batch_size': batch_size,
+            'audio_seconds': len(item['audio']) / asr.SAMPLE_RATE,
+        },
+    }
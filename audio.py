@@ -0,0 +1,100 @@
+"""
+In-memory audio helpers for StoryWeaver
+Turns recorder WAV bytes into the 16 kHz mono float32 array Whisper expects
+without writing temp files or spawning ffmpeg, and trims silence with a
+lightweight energy-based voice activity detector before transcription
+"""
+
+import io
+
+import asr
+import config
+
+# Speech thresholds are clamped to this range (dBFS) whatever the noise floor
+_QUIETEST_SPEECH_DB = -50.0
+_LOUDEST_THRESHOLD_DB = -35.0
+_FRAME_MS = 30
+
+
+def decode_wav_bytes(data, sample_rate=asr.SAMPLE_RATE):
+    """Decode WAV bytes (e.g. from st_audiorec) into mono float32 samples"""
+    import numpy as np
+    import soundfile as sf
+
+    samples, source_rate = sf.read(io.BytesIO(data), dtype="float32", always_2d=True)
+    # Down-mix to mono the same way ffmpeg's "-ac 1" does
+    samples = samples.mean(axis=1)
+
+    if source_rate != sample_rate and samples.size:
+        import librosa
+        samples = librosa.resample(samples, orig_sr=source_rate, target_sr=sample_rate, res_type="soxr_hq")
+
+    return np.ascontiguousarray(samples, dtype=np.float32)
+
+
+def wav_duration(data):
+    """Return the length of WAV bytes in seconds without decoding the samples"""
+    import soundfile as sf
+
+    info = sf.info(io.BytesIO(data))
+    return info.frames / info.samplerate if info.samplerate else 0.0
+
+
+def trim_silence(samples, sample_rate=asr.SAMPLE_RATE, margin_db=None, min_speech_ms=None, padding_ms=None):
+    """Cut leading/trailing silence and shorten long pauses
+
+    Frames of 30 ms count as speech when their level is `margin_db` above
+    the clip's noise floor (its quietest 10% of frames); single-frame clicks
+    are ignored. Each stretch of speech keeps `padding_ms` of context on
+    both sides, so pauses longer than twice that are shortened. Returns
+    (samples, report); report has input_seconds, output_seconds,
+    removed_seconds and speech, which is False when less than
+    `min_speech_ms` of speech was found and the clip should not be
+    transcribed at all.
+    """
+    import numpy as np
+
+    margin_db = margin_db if margin_db is not None else config.VAD_MARGIN_DB
+    min_speech_ms = min_speech_ms if min_speech_ms is not None else config.VAD_MIN_SPEECH_MS
+    padding_ms = padding_ms if padding_ms is not None else config.VAD_PADDING_MS
+
+    samples = np.asarray(samples, dtype=np.float32).ravel()
+    input_seconds = samples.size / sample_rate
+    frame = max(1, int(sample_rate * _FRAME_MS / 1000))
+    frames = -(-samples.size // frame)
+
+    voiced = np.zeros(frames, dtype=bool)
+    if samples.size:
+        padded = np.zeros(frames * frame, dtype=np.float32)
+        padded[:samples.size] = samples
+        rms = np.sqrt(np.mean(np.square(padded.reshape(frames, frame)), axis=1))
+        level = 20 * np.log10(np.maximum(rms, 1e-10))
+        floor = np.percentile(level, 10)
+        threshold = min(max(floor + margin_db, _QUIETEST_SPEECH_DB), _LOUDEST_THRESHOLD_DB)
+        voiced = level > threshold
+
+    # Start/end frame of every voiced run, dropping single-frame clicks
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], voiced.astype(np.int8), [0]))))
+    runs = [(start, end) for start, end in zip(edges[::2], edges[1::2]) if end - start > 1]
+    speech_ms = sum(end - start for start, end in runs) * _FRAME_MS
+
+    if speech_ms < min_speech_ms:
+        trimmed = samples[:0]
+    else:
+        pad = int(sample_rate * padding_ms / 1000)
+        ranges = []
+        for start, end in runs:
+            start, end = max(0, start * frame - pad), min(samples.size, end * frame + pad)
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], end)
+            else:
+                ranges.append([start, end])
+        trimmed = np.concatenate([samples[start:end] for start, end in ranges])
+
+    output_seconds = trimmed.size / sample_rate
+    return np.ascontiguousarray(trimmed), {
+        'input_seconds': input_seconds,
+        'output_seconds': output_seconds,
+        'removed_seconds': input_seconds - output_seconds,
+        'speech': bool(trimmed.size),
+    }
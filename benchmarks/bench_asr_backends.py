@@ -0,0 +1,163 @@
+"""
+Benchmark: accuracy and latency of ASR backends on recorded clips
+
+Usage:
+    python benchmarks/bench_asr_backends.py clips/*.wav \
+        --candidate whisper:base --candidate faster-whisper:base:int8 --threads 1 2 4
+
+Each candidate is backend:model[:compute_type] and runs in its own
+process per thread count, so memory and thread settings do not leak
+between runs. Clips are decoded and silence-trimmed as in the app. A clip's
+reference transcript is read from a .txt file with the same name; clips
+without one are compared against the first candidate's transcript instead.
+
+Reports load time, resident memory, median latency, real-time factor,
+audio seconds transcribed per second per thread, and word error rate, so
+a cheaper backend can be judged on how much accuracy it gives up.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Only speech recognition runs here, so no API key is needed
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import asr
+import audio
+import config
+import scoring
+
+
+def parse_candidate(text):
+    backend, _, rest = text.partition(":")
+    name, _, compute_type = rest.partition(":")
+    return backend, name or config.WHISPER_MODEL, compute_type or None
+
+
+def load_clips(paths):
+    clips = []
+    for path in paths:
+        with open(path, "rb") as f:
+            samples = audio.decode_wav_bytes(f.read())
+        if config.VAD_ENABLED:
+            samples, _ = audio.trim_silence(samples)
+        clips.append((os.path.basename(path), samples))
+    return clips
+
+
+def run_candidate(candidate, threads, paths, repeat):
+    """Measure one backend in this process; returns a JSON-serialisable dict"""
+    import numpy as np
+
+    backend, name, compute_type = parse_candidate(candidate)
+    clips = load_clips(paths)
+
+    rss_before = asr.current_rss_mb()
+    start = time.perf_counter()
+    model = asr.BACKENDS[backend](name, compute_type=compute_type, threads=threads)
+    load_seconds = time.perf_counter() - start
+    model.transcribe(np.zeros(asr.SAMPLE_RATE, dtype=np.float32), fp16=False)
+
+    results = []
+    for clip_name, samples in clips:
+        timings, text = [], ""
+        for _ in range(repeat):
+            start = time.perf_counter()
+            text = model.transcribe(samples, fp16=False).get("text", "").strip() if samples.size else ""
+            timings.append(time.perf_counter() - start)
+        results.append({'clip': clip_name, 'audio_seconds': samples.size / asr.SAMPLE_RATE,
+                        'seconds': statistics.median(timings), 'text': text})
+
+    return {
+        'candidate': candidate,
+        'threads': threads,
+        'load_seconds': load_seconds,
+        'rss_mb': asr.current_rss_mb(),
+        'rss_delta_mb': asr.current_rss_mb() - rss_before if rss_before is not None else None,
+        'clips': results,
+    }
+
+
+def word_error_rate(pairs):
+    """Corpus WER over (reference, hypothesis) pairs"""
+    errors = words = 0
+    for reference, hypothesis in pairs:
+        result = scoring.score(reference, hypothesis)
+        errors += result['substitutions'] + result['deletions'] + result['insertions']
+        words += len(scoring.tokenize(reference))
+    return errors / words if words else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("clips", nargs="+", help="WAV recordings, optionally with .txt references")
+    parser.add_argument("--candidate", action="append", default=None,
+                        help="backend:model[:compute_type], repeatable (default: whisper and faster-whisper int8)")
+    parser.add_argument("--threads", type=int, nargs="+", default=[config.ASR_THREADS or os.cpu_count() or 1])
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per clip")
+    parser.add_argument("--out", default=None, help="Write the full results as JSON here")
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_candidate(args.run, args.threads[0], args.clips, args.repeat)))
+        return
+
+    candidates = args.candidate or [f"whisper:{config.WHISPER_MODEL}", f"faster-whisper:{config.WHISPER_MODEL}:int8"]
+    references = {}
+    for path in args.clips:
+        text_path = os.path.splitext(path)[0] + ".txt"
+        if os.path.exists(text_path):
+            with open(text_path, 'r', encoding='utf-8') as f:
+                references[os.path.basename(path)] = f.read().strip()
+
+    runs = []
+    for candidate in candidates:
+        for threads in args.threads:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *args.clips, "--run", candidate,
+                 "--threads", str(threads), "--repeat", str(args.repeat)],
+                capture_output=True, text=True,
+            )
+            if completed.returncode != 0:
+                print(f"{candidate} threads={threads} failed: {completed.stderr.strip().splitlines()[-1]}")
+                continue
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if not runs:
+        sys.exit("No candidate could be run")
+
+    # Without a reference, agreement with the first candidate is the best we can do
+    fallback = {clip['clip']: clip['text'] for clip in runs[0]['clips']}
+    print(f"\n{'candidate':<32} {'threads':>7} {'load s':>7} {'RSS MB':>7} {'median s':>9} "
+          f"{'RTF':>6} {'audio s/s/thread':>17} {'WER':>6}")
+    for run in runs:
+        latencies = [clip['seconds'] for clip in run['clips']]
+        audio_seconds = sum(clip['audio_seconds'] for clip in run['clips'])
+        run['rtf'] = sum(latencies) / audio_seconds if audio_seconds else None
+        run['audio_seconds_per_thread'] = audio_seconds / sum(latencies) / run['threads'] if sum(latencies) else None
+        run['wer'] = word_error_rate(
+            (references.get(clip['clip'], fallback[clip['clip']]), clip['text']) for clip in run['clips']
+        )
+        wer = f"{run['wer']:.1%}" if run['wer'] is not None else "-"
+        print(f"{run['candidate']:<32} {run['threads']:>7} {run['load_seconds']:>7.1f} {run['rss_mb'] or 0:>7.0f} "
+              f"{statistics.median(latencies):>9.2f} {run['rtf'] or 0:>6.2f} "
+              f"{run['audio_seconds_per_thread'] or 0:>17.1f} {wer:>6}")
+    if len(references) < len(args.clips):
+        print(f"\n{len(args.clips) - len(references)} clip(s) have no .txt reference; "
+              f"their WER is measured against {runs[0]['candidate']}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'references': references, 'runs': runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
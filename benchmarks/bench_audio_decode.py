@@ -0,0 +1,105 @@
+"""
+Benchmark: in-memory WAV decode vs. temp file + ffmpeg (whisper.load_audio)
+
+Usage:
+    python benchmarks/bench_audio_decode.py [clip.wav ...] [--repeat 20]
+
+Without clip arguments a few synthetic recorder-style clips (44.1 kHz,
+16-bit stereo) are generated. Reports the median per-clip latency of both
+paths and the largest sample difference between them.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# audio reaches config through asr; decoding needs no API key
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import numpy as np
+
+import audio
+
+
+def synthetic_clip(seconds, sample_rate=44100, channels=2):
+    """Build WAV bytes shaped like st_audiorec output"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    tone = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) / 2
+    pcm = (np.repeat(tone[:, None], channels, axis=1) * 32767).astype("<i2")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def file_path_decode(data):
+    """What the app did before: write a WAV to disk, then ffmpeg-decode it"""
+    import whisper
+
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        return whisper.load_audio(path)
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("clips", nargs="*", help="WAV files to decode (default: synthetic clips)")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per clip and path")
+    args = parser.parse_args()
+
+    if args.clips:
+        clips = []
+        for path in args.clips:
+            with open(path, "rb") as f:
+                clips.append((os.path.basename(path), f.read()))
+    else:
+        clips = [(f"synthetic_{s}s", synthetic_clip(s)) for s in (3, 8, 20)]
+
+    try:
+        import whisper  # noqa: F401
+        have_ffmpeg_path = True
+    except ImportError:
+        have_ffmpeg_path = False
+        print("openai-whisper not installed: only timing the in-memory path")
+
+    # First call pays librosa/soxr import cost; keep it out of the numbers
+    audio.decode_wav_bytes(clips[0][1])
+
+    print(f"{'clip':<20} {'in-memory ms':>13} {'file+ffmpeg ms':>15} {'saved ms':>9} {'max |diff|':>11}")
+    for name, data in clips:
+        memory_seconds, memory_samples = time_call(lambda: audio.decode_wav_bytes(data), args.repeat)
+        if have_ffmpeg_path:
+            file_seconds, file_samples = time_call(lambda: file_path_decode(data), args.repeat)
+            length = min(len(memory_samples), len(file_samples))
+            diff = float(np.max(np.abs(memory_samples[:length] - file_samples[:length]))) if length else 0.0
+            print(f"{name:<20} {memory_seconds * 1000:>13.2f} {file_seconds * 1000:>15.2f} "
+                  f"{(file_seconds - memory_seconds) * 1000:>9.2f} {diff:>11.4f}")
+        else:
+            print(f"{name:<20} {memory_seconds * 1000:>13.2f} {'-':>15} {'-':>9} {'-':>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Benchmark: full session flow (describe -> story -> practice) for N children
+
+Usage:
+    python benchmarks/bench_end_to_end.py [--children 8] [--sessions 3] [--out results.json]
+    python benchmarks/bench_end_to_end.py --whisper base --fixtures recordings/
+    python benchmarks/bench_end_to_end.py --compare old.json --out new.json
+
+Each child is a thread, as each browser session is in Streamlit, and runs
+the same steps as app.py: pick a picture, decode and transcribe the
+description, run the LLM pipeline, prefetch and play story audio, then read
+every section until it passes (at most --max-attempts), scoring each attempt
+and committing the session to a throwaway progress store.
+
+The language model and TTS are the offline fakes with fixed latencies.
+Transcription is a fake that sleeps --asr-rtf seconds per second of audio
+and returns a scripted transcript, or the real Whisper model with
+--whisper. Audio is synthetic recorder-style WAV sized to the words read,
+or the WAV files in --fixtures (cycled); with real Whisper use recorded
+speech, since an empty transcript falls back to the script.
+
+Reports sessions/minute, p50/p95/p99 per stage and peak RSS, and writes
+them as JSON; --compare prints the change against an earlier run and exits
+non-zero when throughput or a stage's p95 regressed by more than
+--tolerance.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# The fake language model is installed below, so no API key is needed
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import config
+
+# Every stage must land in one in-memory window and nowhere else
+config.TELEMETRY_ENABLED = True
+config.TELEMETRY_FILE = ""
+config.TELEMETRY_PORT = 0
+config.TELEMETRY_WINDOW = 10_000_000
+config.TELEMETRY_SLOW_SECONDS = float("inf")
+
+import asr
+import audio
+import llm
+import picture_catalog
+import practice
+import progress_store
+import scoring
+import telemetry
+import tts
+from bench_audio_decode import synthetic_clip
+
+RESULT_VERSION = 1
+
+DESCRIPTIONS = [
+    "the {subject} runned to the park",
+    "dis {subject} have a big smile",
+    "I see a {subject} and it goed away",
+    "the {subject} is happy and it have two foots",
+    "a {subject} is very nice",
+]
+
+
+class FakeWhisper:
+    """Transcribes nothing; sleeps in proportion to the audio and returns the scripted text"""
+
+    def __init__(self, rtf):
+        self.rtf = rtf
+        self.script = ""
+
+    def say(self, text):
+        self.script = text
+
+    def transcribe(self, samples, **kwargs):
+        time.sleep(self.rtf * len(samples) / asr.SAMPLE_RATE)
+        return {'text': " " + self.script}
+
+
+class AudioSource:
+    """WAV bytes for an utterance of `words` words, from fixtures or generated"""
+
+    def __init__(self, fixtures=None):
+        self.fixtures = []
+        for path in sorted(glob.glob(os.path.join(fixtures, "*.wav"))) if fixtures else []:
+            with open(path, "rb") as f:
+                self.fixtures.append(f.read())
+        self._generated = {}
+        self._lock = threading.Lock()
+
+    def clip(self, words, rng):
+        if self.fixtures:
+            return rng.choice(self.fixtures)
+        # Children read about two words a second; round so clips are reused
+        seconds = round((0.5 + 0.45 * words) * 2) / 2
+        with self._lock:
+            if seconds not in self._generated:
+                self._generated[seconds] = synthetic_clip(seconds)
+            return self._generated[seconds]
+
+
+def misread(text, attempt, rng):
+    """Drop words from `text`, fewer on each later attempt"""
+    drop = 0.35 / (attempt + 1)
+    words = text.split()
+    kept = [word for word in words if rng.random() >= drop]
+    return " ".join(kept or words[:1])
+
+
+def transcribe(model, wav_bytes, scripted):
+    """Same steps and spans as the app's practice checks"""
+    if isinstance(model, FakeWhisper):
+        model.say(scripted)
+    try:
+        text = practice.recognize(wav_bytes, model).get("text", "").strip()
+    except practice.NoSpeech:
+        # The app asks the child to try again; keep the scripted session going
+        return scripted
+    return text or scripted
+
+
+def run_session(child, number, model, speech, tts_cache, store, args):
+    rng = random.Random(f"{args.seed}-{child}-{number}")
+    session_id = f"bench-{child}-{number}"
+    telemetry.set_session(session_id)
+    started = datetime.now()
+
+    with telemetry.span("session"):
+        picture = picture_catalog.get_catalog().choose(rng=rng)
+        subject = picture.subject if picture is not None else "dog"
+
+        description = rng.choice(DESCRIPTIONS).format(subject=subject)
+        transcript = transcribe(model, speech.clip(len(description.split()), rng), description)
+
+        with telemetry.span("llm_pipeline", transcript_chars=len(transcript)) as span:
+            result = llm.run_pipeline(subject, transcript, mode=args.pipeline)
+            span.set(mode=result['mode'], round_trips=result['round_trips'], errors=len(result['errors']))
+        errors = result['errors']
+        sections = [s.strip() for s in result['story'].split('|') if s.strip()]
+        tts_cache.prefetch(sections)
+
+        section_attempts = {}
+        focus = [err.get('correction', '').lower() for err in errors if err.get('correction')]
+        for index, section in enumerate(sections):
+            with telemetry.span("text_to_speech", text_chars=len(section)):
+                tts_cache.get(section, lang='en', slow=False)
+
+            attempts = section_attempts[f"section_{index}"] = []
+            for attempt in range(args.max_attempts):
+                spoken = misread(section, attempt, rng)
+                heard = transcribe(model, speech.clip(len(spoken.split()), rng), spoken)
+                with telemetry.span("scoring", reference_words=len(section.split()), transcript_chars=len(heard)):
+                    accuracy = scoring.score(section, heard,
+                                             focus_words=[w for w in focus if w in section.lower()])['accuracy']
+                attempts.append({'reference': section, 'transcript': heard, 'accuracy': accuracy,
+                                 'timestamp': datetime.now().isoformat()})
+                if accuracy >= config.ACCURACY_THRESHOLD:
+                    break
+
+        accuracies = [a['accuracy'] for attempts in section_attempts.values() for a in attempts]
+        session_data = {
+            'session_id': session_id,
+            'profile_id': f"bench-child-{child}",
+            'date': started.strftime("%Y-%m-%d %H:%M:%S"),
+            'subject': subject,
+            'initial_errors': len(errors),
+            'errors_detail': errors,
+            'sections_completed': len(sections),
+            'total_attempts': len(accuracies),
+            'average_accuracy': sum(accuracies) / len(accuracies) if accuracies else 0,
+            'section_attempts': section_attempts,
+        }
+        with telemetry.span("save_progress", attempts=len(accuracies)):
+            store.commit_session(session_data)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Print changes against `baseline`; return the list of regressions"""
+    def change(new, old):
+        return (new - old) / old if old else 0.0
+
+    regressions = []
+    rate = change(current['sessions_per_minute'], baseline['sessions_per_minute'])
+    print(f"\nvs {baseline.get('git_commit') or 'baseline'} ({baseline['created']}):")
+    print(f"  sessions/minute {baseline['sessions_per_minute']:.1f} -> {current['sessions_per_minute']:.1f} ({rate:+.0%})")
+    if rate < -tolerance:
+        regressions.append("sessions_per_minute")
+    print(f"  peak RSS MB     {baseline['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f}")
+
+    for stage, stats in current['stages'].items():
+        old = baseline['stages'].get(stage)
+        if old is None:
+            print(f"  {stage:<16} new stage")
+            continue
+        p95 = change(stats['p95'], old['p95'])
+        flag = "  REGRESSION" if p95 > tolerance else ""
+        print(f"  {stage:<16} p50 {old['p50'] * 1000:8.1f} -> {stats['p50'] * 1000:8.1f} ms   "
+              f"p95 {old['p95'] * 1000:8.1f} -> {stats['p95'] * 1000:8.1f} ms ({p95:+.0%}){flag}")
+        if flag:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--children", type=int, default=8, help="Concurrent children (threads)")
+    parser.add_argument("--sessions", type=int, default=3, help="Sessions per child")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per section before moving on")
+    parser.add_argument("--pipeline", choices=llm.PIPELINE_MODES, default=config.LLM_PIPELINE)
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Fake model latency per request")
+    parser.add_argument("--tts-latency-ms", type=float, default=300, help="Fake TTS latency per sentence")
+    parser.add_argument("--asr-rtf", type=float, default=0.1, help="Fake ASR seconds per second of audio")
+    parser.add_argument("--whisper", default=None, help="Use this real Whisper model instead of the fake")
+    parser.add_argument("--fixtures", default=None, help="Directory of WAV recordings to use as speech")
+    parser.add_argument("--response-cache", action="store_true", help="Keep the LLM response cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Write results JSON here")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    # Removed afterwards, with the databases, caches and shards the run wrote
+    with tempfile.TemporaryDirectory(prefix="storyweaver-bench-") as workdir:
+        config.RESPONSE_CACHE_ENABLED = args.response_cache
+        config.RESPONSE_CACHE_PATH = os.path.join(workdir, "responses.sqlite3")
+
+        llm.set_backend(llm.FakeBackend(latency=args.llm_latency_ms / 1000))
+        tts_cache = tts.TTSCache(backend=tts.FakeBackend(latency=args.tts_latency_ms / 1000),
+                                 directory=os.path.join(workdir, "tts"))
+        # Each child saves to their own shard, as in the app
+        store = progress_store.ShardedProgressStore(os.path.join(workdir, "progress"),
+                                                    os.path.join(workdir, "progress.sqlite3"))
+        speech = AudioSource(args.fixtures)
+        # Pay one-off costs (imports, resampler setup, model load) before timing
+        audio.decode_wav_bytes(speech.clip(3, random.Random(args.seed)))
+        if args.whisper:
+            shared_model = asr.warm_up(args.whisper)
+        picture_catalog.get_catalog()
+
+        failures = []
+
+        def child(index):
+            # Real Whisper is shared like in the app; each fake keeps its own script
+            model = shared_model if args.whisper else FakeWhisper(args.asr_rtf)
+            for number in range(args.sessions):
+                try:
+                    run_session(index, number, model, speech, tts_cache, store, args)
+                except Exception as e:
+                    failures.append(f"child {index} session {number}: {e!r}")
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=child, args=(i,), name=f"child-{i}") for i in range(args.children)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+    summary = telemetry.get_telemetry().summary()
+    completed = summary.get("session", {}).get('count', 0) - len(failures)
+    results = {
+        'benchmark': "end_to_end",
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec="seconds"),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        'sessions': completed,
+        'failures': failures,
+        'wall_seconds': wall,
+        'sessions_per_minute': completed / wall * 60 if wall else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': summary,
+    }
+
+    print(f"{completed} sessions by {args.children} children in {wall:.1f}s: "
+          f"{results['sessions_per_minute']:.1f} sessions/minute, peak RSS {results['peak_rss_mb']:.0f} MB")
+    print(f"{'stage':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage, stats in summary.items():
+        print(f"{stage:<16} {stats['count']:>6} {stats['p50'] * 1000:>9.1f} "
+              f"{stats['p95'] * 1000:>9.1f} {stats['p99'] * 1000:>9.1f}")
+    for failure in failures:
+        print(f"FAILED {failure}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    sys.exit(1 if failures or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: import time of the modules app.py loads before the first render
+
+Usage:
+    python benchmarks/bench_import_time.py [--budget-ms 150] [--top 15] [--out imports.json]
+
+Reads app.py's top-level imports, imports the project modules among them in
+a fresh interpreter under `python -X importtime`, and reports the total and
+the slowest modules. Exits non-zero when a heavy dependency (Whisper,
+torch, pandas, the Gemini client, ...) is imported at startup or the total
+passes --budget-ms, so a stray top-level import shows up before it reaches
+a cold start. Streamlit's own import time is reported separately when it
+is installed.
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only be imported lazily, after the page has rendered
+HEAVY = ("whisper", "torch", "torchaudio", "pandas", "google.generativeai", "gtts",
+         "librosa", "soundfile", "numpy", "pyarrow", "PIL")
+
+
+def app_imports(path):
+    """Top-level module names imported by a script, in order"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return list(dict.fromkeys(names))
+
+
+def import_profile(modules):
+    """Run `import modules` under -X importtime; return [(module, self_us, cumulative_us, depth)]"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    # config refuses to load the Gemini backend without an API key
+    env.setdefault("LLM_BACKEND", "fake")
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=150, help="Allowed import time of project modules")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest modules to list")
+    parser.add_argument("--out", default=None, help="Write the report as JSON here")
+    args = parser.parse_args()
+
+    imports = app_imports(os.path.join(ROOT, "app.py"))
+    project = [name for name in imports if os.path.exists(os.path.join(ROOT, f"{name.split('.')[0]}.py"))]
+    third_party = [name for name in imports if name not in project]
+
+    try:
+        rows = import_profile(project)
+    except RuntimeError as e:
+        sys.exit(f"Importing the project modules failed: {e}")
+    loaded = {name for name, _, _, _ in rows}
+    # -X importtime lists each module once, nested under whoever imported it first
+    total_ms = sum(cumulative for name, _, cumulative, depth in rows if depth == 0 and name in project) / 1000
+    heavy = sorted(name for name in loaded if name in HEAVY or name.split(".")[0] in HEAVY)
+
+    print(f"Project modules imported by app.py: {', '.join(project)}")
+    print(f"Total import time: {total_ms:.1f} ms (budget {args.budget_ms:g} ms)")
+    print(f"\n{'module':<40} {'self ms':>8} {'cumulative ms':>14}")
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: row[1], reverse=True)[:args.top]:
+        print(f"{name:<40} {self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}")
+
+    report = {'project_modules': project, 'total_ms': total_ms, 'budget_ms': args.budget_ms, 'heavy': heavy}
+    report['third_party_ms'] = {}
+    print("\nThird-party imports in app.py (each in a fresh interpreter):")
+    for name in third_party:
+        try:
+            cumulative = [row[2] for row in import_profile([name]) if row[0] == name and row[3] == 0]
+        except RuntimeError as e:
+            print(f"  {name:<20} skipped ({e})")
+            continue
+        report['third_party_ms'][name] = cumulative[0] / 1000 if cumulative else 0.0
+        print(f"  {name:<20} {report['third_party_ms'][name]:8.1f} ms")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    failed = False
+    if heavy:
+        print(f"\nFAIL: heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\nFAIL: import time {total_ms:.1f} ms is over the {args.budget_ms:g} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark: LLM pipeline modes (sequential / combined)
+
+Usage:
+    python benchmarks/bench_llm_pipeline.py [--latency-ms 800] [--runs 5]
+
+Runs every mode against the offline fake model with a fixed per-request
+latency and reports wall time and round trips per transcript, so the modes
+can be compared without an API key. The response cache is off, so every
+request reaches the model.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Every mode runs against the offline fake model
+os.environ.setdefault("LLM_BACKEND", "fake")
+# Cached replies would turn every mode after the first into instant hits,
+# and fake stories must not land in the real cache
+os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+import llm
+
+TRANSCRIPTS = [
+    ("dog", "the dog runned fast"),
+    ("cat", "dis cat have a ball"),
+    ("rainbow", "I see a big rainbow"),
+    ("car", "the car goed to the shop"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=800, help="Fake model latency per request")
+    parser.add_argument("--runs", type=int, default=3, help="Repetitions per transcript")
+    args = parser.parse_args()
+
+    llm.set_backend(llm.FakeBackend(latency=args.latency_ms / 1000))
+
+    print(f"{'mode':<12} {'median s':>9} {'max s':>7} {'round trips':>12}")
+    for mode in llm.PIPELINE_MODES:
+        seconds, trips = [], []
+        for _ in range(args.runs):
+            for subject, transcript in TRANSCRIPTS:
+                result = llm.run_pipeline(subject, transcript, mode=mode)
+                seconds.append(result['seconds'])
+                trips.append(result['round_trips'])
+        print(f"{mode:<12} {statistics.median(seconds):>9.2f} {max(seconds):>7.2f} "
+              f"{statistics.fmean(trips):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
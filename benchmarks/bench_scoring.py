@@ -0,0 +1,105 @@
+"""
+Benchmark: word-aligned scoring vs. the previous SequenceMatcher accuracy
+
+Usage:
+    python benchmarks/bench_scoring.py [progress.json ...] [--repeat 20]
+
+Progress files store each attempt's transcript but not the section text,
+so every section's best attempt stands in as its reference text and all
+attempts of that section are scored against it with both functions.
+Reports agreement (mean difference, correlation, and how often both put
+an attempt in the same 60/80 feedback band) and the time per attempt for
+both functions. A synthetic long-section run shows how both scale with
+section length.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Scoring never calls the language model
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import progress_store
+import scoring
+
+
+def legacy_accuracy(original, spoken):
+    """The accuracy function app.py used before the scoring engine"""
+    original = original.lower().strip()
+    spoken = spoken.lower().strip()
+    return SequenceMatcher(None, original, spoken).ratio() * 100
+
+
+def band(accuracy):
+    return 2 if accuracy >= 80 else 1 if accuracy >= 60 else 0
+
+
+def load_pairs(paths):
+    pairs = []
+    for path in paths:
+        for session in progress_store.load_json_sessions(path):
+            for attempts in session.get('section_attempts', {}).values():
+                if not attempts:
+                    continue
+                reference = max(attempts, key=lambda a: a['accuracy'])['transcript']
+                pairs.extend((reference, attempt['transcript']) for attempt in attempts)
+    return pairs
+
+
+def best_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", default=[os.path.join(ROOT, "data", "sample_progress.json")])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.files)
+    old = [legacy_accuracy(ref, spoken) for ref, spoken in pairs]
+    new = [scoring.score(ref, spoken)['accuracy'] for ref, spoken in pairs]
+
+    diffs = [abs(a - b) for a, b in zip(old, new)]
+    same_band = sum(band(a) == band(b) for a, b in zip(old, new))
+    print(f"attempts scored:           {len(pairs)}")
+    print(f"mean |old - new|:          {statistics.fmean(diffs):.1f} points")
+    print(f"correlation:               {statistics.correlation(old, new):.3f}")
+    print(f"same feedback band:        {same_band}/{len(pairs)}")
+
+    old_seconds = best_time(lambda: [legacy_accuracy(r, s) for r, s in pairs], args.repeat)
+    new_seconds = best_time(lambda: [scoring.score(r, s) for r, s in pairs], args.repeat)
+    per = 1e6 / len(pairs)
+    print(f"SequenceMatcher:           {old_seconds * per:8.1f} us/attempt")
+    print(f"scoring.score:             {new_seconds * per:8.1f} us/attempt "
+          f"({old_seconds / new_seconds:.1f}x vs SequenceMatcher)")
+
+    # SequenceMatcher is fast on near-identical strings and slow on unrelated
+    # ones, so long sections are timed for both kinds of attempt. A long
+    # section is several consecutive sections, read with their own attempts
+    unrelated = " ".join(s for _, s in pairs[len(pairs) // 2:])
+    for label, make_spoken in (("similar attempt", lambda count: " ".join(s for _, s in pairs[:count])),
+                               ("unrelated attempt", lambda count: unrelated)):
+        print(f"\nlong sections, {label}:")
+        for count in (1, 10, len(pairs)):
+            long_ref = " ".join(r for r, _ in pairs[:count])
+            long_spoken = make_spoken(count)
+            old_seconds = best_time(lambda: legacy_accuracy(long_ref, long_spoken), 3)
+            new_seconds = best_time(lambda: scoring.score(long_ref, long_spoken), 3)
+            print(f"  {len(scoring.tokenize(long_ref)):5d} words: SequenceMatcher {old_seconds * 1000:8.2f} ms,"
+                  f" scoring {new_seconds * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: silence trimming (audio.trim_silence) before transcription
+
+Usage:
+    python benchmarks/bench_vad.py [clip.wav ...] [--model base] [--repeat 3]
+
+Without clip arguments a few synthetic recorder-style clips are generated:
+voiced bursts with pauses between them and long leading/trailing silence
+over a faint noise floor. For each clip it reports how much audio the VAD
+removed and what it cost; with openai-whisper installed it also times
+transcription of the untrimmed and trimmed audio and prints both
+transcripts.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config (through asr) must load without an API key
+os.environ.setdefault("LLM_BACKEND", "fake")
+
+import numpy as np
+
+import asr
+import audio
+
+
+def synthetic_recording(parts, sample_rate=44100, seed=0):
+    """WAV bytes alternating silence and voiced bursts; `parts` is [(seconds, voiced), ...]"""
+    rng = np.random.default_rng(seed)
+    pieces = []
+    for seconds, voiced in parts:
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        piece = 0.003 * rng.standard_normal(t.size)
+        if voiced:
+            # A wobbling pitch and syllable-rate envelope, loosely speech-like
+            pitch = 200 + 30 * np.sin(2 * np.pi * 0.7 * t)
+            piece += 0.25 * np.sin(2 * np.pi * np.cumsum(pitch) / sample_rate) * (0.5 + 0.5 * np.abs(np.sin(2 * np.pi * 2.5 * t)))
+        pieces.append(piece)
+    pcm = (np.clip(np.concatenate(pieces), -1, 1) * 32767).astype("<i2")
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.repeat(pcm[:, None], 2, axis=1).tobytes())
+    return buffer.getvalue()
+
+
+SYNTHETIC = {
+    'short_answer': [(1.5, False), (1.2, True), (2.5, False)],
+    'sentence_with_pauses': [(2.0, False), (1.5, True), (1.5, False), (2.0, True), (1.0, False), (1.0, True), (3.0, False)],
+    'long_hesitant': [(3.0, False), (2.0, True), (4.0, False), (2.5, True), (5.0, False), (2.0, True), (6.0, False)],
+    'silence_only': [(6.0, False)],
+}
+
+
+def median_seconds(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("clips", nargs="*", help="WAV files (default: synthetic clips)")
+    parser.add_argument("--model", default=None, help="Whisper model to time (default: config.WHISPER_MODEL)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement")
+    args = parser.parse_args()
+
+    if args.clips:
+        clips = []
+        for path in args.clips:
+            with open(path, "rb") as f:
+                clips.append((os.path.basename(path), f.read()))
+    else:
+        clips = [(name, synthetic_recording(parts)) for name, parts in SYNTHETIC.items()]
+
+    try:
+        model = asr.get_model(args.model)
+        model.transcribe(np.zeros(asr.SAMPLE_RATE, dtype=np.float32), fp16=False)
+    except ImportError:
+        model = None
+        print("openai-whisper not installed: reporting audio removed and VAD cost only")
+
+    # First call pays librosa/soxr import cost; keep it out of the numbers
+    audio.decode_wav_bytes(clips[0][1])
+
+    print(f"{'clip':<22} {'audio s':>8} {'kept s':>7} {'removed':>8} {'vad ms':>7} {'asr full s':>11} {'asr trimmed s':>14}")
+    for name, data in clips:
+        samples = audio.decode_wav_bytes(data)
+        vad_seconds, (trimmed, report) = median_seconds(lambda: audio.trim_silence(samples), args.repeat)
+        removed = report['removed_seconds'] / report['input_seconds'] if report['input_seconds'] else 0.0
+
+        full_text = trimmed_text = None
+        full_asr = trimmed_asr = "-"
+        if model is not None:
+            seconds, result = median_seconds(lambda: model.transcribe(samples, fp16=False), args.repeat)
+            full_asr, full_text = f"{seconds:.2f}", result['text'].strip()
+            if report['speech']:
+                seconds, result = median_seconds(lambda: model.transcribe(trimmed, fp16=False), args.repeat)
+                trimmed_asr, trimmed_text = f"{seconds:.2f}", result['text'].strip()
+            else:
+                trimmed_asr, trimmed_text = "skipped", ""
+
+        print(f"{name:<22} {report['input_seconds']:>8.1f} {report['output_seconds']:>7.1f} {removed:>8.0%} "
+              f"{vad_seconds * 1000:>7.2f} {full_asr:>11} {trimmed_asr:>14}")
+        if full_text is not None:
+            print(f"    full:    {full_text!r}\n    trimmed: {trimmed_text!r}")
+
+
+if __name__ == "__main__":
+    main()
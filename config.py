@@ -13,16 +13,86 @@ load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 ENABLE_GOOGLE_GENAI = os.getenv("ENABLE_GOOGLE_GENAI", "true").lower() in ("1", "true", "yes")
 
+# Language Model Configuration ("gemini", or "fake" for offline runs)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+# "sequential" or "combined" (errors and story in one structured request)
+LLM_PIPELINE = os.getenv("LLM_PIPELINE", "sequential")
+FAKE_LLM_LATENCY_MS = int(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+
+# LLM response cache (similarity 0 = exact matches only, e.g. 0.85 for near-duplicate stories)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_TTL_HOURS = float(os.getenv("RESPONSE_CACHE_TTL_HOURS", "168"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
 # Model Configuration
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+WHISPER_WARMUP = os.getenv("WHISPER_WARMUP", "false").lower() in ("1", "true", "yes")
+# "whisper" (openai-whisper, PyTorch) or "faster-whisper" (CTranslate2, int8 on CPU)
+ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")
+ASR_THREADS = int(os.getenv("ASR_THREADS", "0"))  # threads per model; 0 = library default
+ASR_STREAM_WINDOW_SECONDS = float(os.getenv("ASR_STREAM_WINDOW_SECONDS", "30"))
+ASR_STREAM_STEP_SECONDS = float(os.getenv("ASR_STREAM_STEP_SECONDS", "5"))
+
+# Silence trimming before transcription (speech = margin dB above the noise floor)
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() in ("1", "true", "yes")
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "10"))
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "150"))
+VAD_PADDING_MS = int(os.getenv("VAD_PADDING_MS", "200"))
+
+# Practice attempts are transcribed and scored on a background pool; the page polls for results
+PRACTICE_WORKERS = int(os.getenv("PRACTICE_WORKERS", "4"))
+PRACTICE_POLL_SECONDS = float(os.getenv("PRACTICE_POLL_SECONDS", "0.5"))
+
+# ASR worker pool (0 workers = transcribe inline in the Streamlit process)
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "0"))
+ASR_MAX_BATCH_SIZE = int(os.getenv("ASR_MAX_BATCH_SIZE", "8"))
+ASR_MAX_BATCH_DELAY_MS = int(os.getenv("ASR_MAX_BATCH_DELAY_MS", "50"))
+ASR_QUEUE_SIZE = int(os.getenv("ASR_QUEUE_SIZE", "64"))
+ASR_SUBMIT_TIMEOUT = float(os.getenv("ASR_SUBMIT_TIMEOUT", "5"))
+ASR_REQUEST_TIMEOUT = float(os.getenv("ASR_REQUEST_TIMEOUT", "120"))
+
+# Text-to-Speech ("gtts", "command" for a local synthesizer writing WAV to stdout, or "fake" for offline runs)
+TTS_BACKEND = os.getenv("TTS_BACKEND", "gtts")
+TTS_COMMAND = os.getenv("TTS_COMMAND", "espeak-ng --stdin --stdout -v {lang} -s {speed}")
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache")
+TTS_CACHE_MAX_MB = int(os.getenv("TTS_CACHE_MAX_MB", "200"))
+TTS_MEMORY_CACHE_MB = int(os.getenv("TTS_MEMORY_CACHE_MB", "32"))
+TTS_PREFETCH_WORKERS = int(os.getenv("TTS_PREFETCH_WORKERS", "4"))
+FAKE_TTS_LATENCY_MS = int(os.getenv("FAKE_TTS_LATENCY_MS", "300"))
 
 # File Paths
 PICTURE_FOLDER = os.getenv("PICTURE_FOLDER", "pictures")
+PICTURE_MAX_SIZE = int(os.getenv("PICTURE_MAX_SIZE", "800"))  # longest side in pixels, 2x the displayed width
+PICTURE_RECHECK_SECONDS = float(os.getenv("PICTURE_RECHECK_SECONDS", "5"))
+PICTURE_RECENT_SUBJECTS = int(os.getenv("PICTURE_RECENT_SUBJECTS", "3"))
 PROGRESS_FILE = os.getenv("PROGRESS_FILE", "progress_data.json")
+PROGRESS_DB = os.getenv("PROGRESS_DB", "progress_data.sqlite3")
+PROGRESS_ROLLING_SESSIONS = int(os.getenv("PROGRESS_ROLLING_SESSIONS", "10"))
+PROGRESS_ROLLING_DAYS = int(os.getenv("PROGRESS_ROLLING_DAYS", "7"))
+
+# Child/therapist profiles; each child's sessions go to their own shard in PROGRESS_SHARD_DIR
+PROFILES_DB = os.getenv("PROFILES_DB", "profiles.sqlite3")
+PROGRESS_SHARD_DIR = os.getenv("PROGRESS_SHARD_DIR", "progress_shards")
+PROGRESS_MAX_OPEN_SHARDS = int(os.getenv("PROGRESS_MAX_OPEN_SHARDS", "64"))
+PROGRESS_PAGE_SIZE = int(os.getenv("PROGRESS_PAGE_SIZE", "5"))  # sessions per page in the sidebar history
+PROFILE_PAGE_SIZE = int(os.getenv("PROFILE_PAGE_SIZE", "50"))  # children listed in the sidebar picker
+DEFAULT_PROFILE_NAME = os.getenv("DEFAULT_PROFILE_NAME", "Everyone")  # holds sessions saved before profiles
+
+# Latency telemetry (TELEMETRY_PORT > 0 serves Prometheus text at /metrics)
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+TELEMETRY_FILE = os.getenv("TELEMETRY_FILE", "metrics.jsonl")
+TELEMETRY_FILE_MAX_MB = int(os.getenv("TELEMETRY_FILE_MAX_MB", "50"))
+TELEMETRY_WINDOW = int(os.getenv("TELEMETRY_WINDOW", "2000"))
+TELEMETRY_SLOW_SECONDS = float(os.getenv("TELEMETRY_SLOW_SECONDS", "5"))
+TELEMETRY_PORT = int(os.getenv("TELEMETRY_PORT", "0"))
+TELEMETRY_ADMIN = os.getenv("TELEMETRY_ADMIN", "false").lower() in ("1", "true", "yes")
 
 # Performance Settings
 ACCURACY_THRESHOLD = int(os.getenv("ACCURACY_THRESHOLD", "80"))
 
-# Validation
-if ENABLE_GOOGLE_GENAI and not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY is required when ENABLE_GOOGLE_GENAI is true")
\ No newline at end of file
+# GOOGLE_API_KEY is checked when the Gemini backend is created, so offline
+# tools that never call the model run without it
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""
+Language model helpers for StoryWeaver
+Builds the error-detection and story prompts, parses the replies and runs
+them as one pipeline. The model behind it is pluggable: Gemini in production
+or a local fake with configurable latency for offline runs and benchmarks.
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+
+import config
+import response_cache
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MODES = ("sequential", "combined")
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class GeminiBackend:
+    """Google Gemini; one client is built per process and reused"""
+
+    name = "gemini"
+
+    def __init__(self, model_name=None):
+        if config.ENABLE_GOOGLE_GENAI and not config.GOOGLE_API_KEY:
+            raise ValueError("GOOGLE_API_KEY is required when ENABLE_GOOGLE_GENAI is true")
+
+        import google.generativeai as genai
+
+        genai.configure(api_key=config.GOOGLE_API_KEY)
+        self.model_name = model_name or config.LLM_MODEL
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def generate(self, prompt, kind=None):
+        return self.model.generate_content(prompt).text
+
+
+class FakeBackend:
+    """Offline stand-in that answers every prompt after a fixed delay
+
+    Replies are deterministic: error detection flags words from a small
+    table of common child errors, and stories repeat the corrections, so the
+    whole pipeline can be exercised and benchmarked without network access.
+    """
+
+    name = "fake"
+
+    COMMON_ERRORS = {
+        "runned": ("grammar", "ran", "We say 'ran' for running that already happened."),
+        "goed": ("grammar", "went", "We say 'went' for going that already happened."),
+        "have": ("grammar", "has", "For one friend we say 'has'."),
+        "wabbit": ("articulation", "rabbit", "Start with a strong /r/ sound."),
+        "dis": ("articulation", "this", "Put your tongue between your teeth for 'th'."),
+        "foots": ("grammar", "feet", "More than one foot is 'feet'."),
+    }
+
+    def __init__(self, latency=None):
+        self.latency = latency if latency is not None else config.FAKE_LLM_LATENCY_MS / 1000
+        self.calls = 0
+
+    def generate(self, prompt, kind=None):
+        time.sleep(self.latency)
+        self.calls += 1
+        if kind == "errors":
+            return json.dumps(self._errors(prompt))
+        if kind == "combined":
+            errors = self._errors(prompt)
+            return json.dumps({'errors': errors, 'story': self._story(prompt, errors)})
+        return self._story(prompt, None)
+
+    def _errors(self, prompt):
+        said = _quoted_transcript(prompt).lower()
+        errors = []
+        for word, (kind, correction, explanation) in self.COMMON_ERRORS.items():
+            if re.search(rf"\b{word}\b", said):
+                errors.append({'type': kind, 'incorrect': word, 'correction': correction,
+                               'explanation': explanation})
+        return errors
+
+    def _story(self, prompt, errors):
+        subject = re.search(r"about: (\w+)", prompt)
+        subject = subject.group(1) if subject else "friend"
+        if errors is None:
+            words = re.findall(r"should be '([^']+)'", prompt)
+        else:
+            words = [err['correction'] for err in errors]
+        focus = " ".join(words) if words else "happy"
+        return (f"Once upon a time there was a {subject}. | "
+                f"The {subject} said {focus} every day. | "
+                f"Everyone loved the {subject} very much.")
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "fake": FakeBackend,
+}
+
+
+def register_backend(name, factory):
+    """Make a model available as config.LLM_BACKEND=`name`"""
+    BACKENDS[name] = factory
+
+
+def get_backend():
+    """Return the process-wide model client, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = BACKENDS[config.LLM_BACKEND]()
+    return _backend
+
+
+def cache_model(backend):
+    """Backend and model name that response cache entries are stored under"""
+    return f"{backend.name}:{getattr(backend, 'model_name', config.LLM_MODEL)}"
+
+
+def set_backend(backend):
+    """Replace the process-wide model client (used by benchmarks)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def error_prompt(transcript):
+    return f"""
+You are a speech therapist helping a child aged 4-6 years.
+Analyze the following child's sentence for errors:
+
+\"{transcript}\"
+
+Identify:
+1. Grammar errors and corrections
+2. Vocabulary errors and corrections
+3. Simple articulation errors that can be inferred from the text
+
+Return a JSON array. Each element must include:
+- type: "grammar" or "vocabulary" or "articulation"
+- incorrect: the incorrect phrase
+- correction: the corrected phrase
+- explanation: short child-friendly explanation (max 15 words)
+
+Return ONLY the JSON array (empty if no errors).
+"""
+
+
+def story_prompt(subject, errors, transcript):
+    if not errors or len(errors) == 0:
+        error_description = "No specific errors were detected, so create a simple engaging story."
+    else:
+        error_list = []
+        for err in errors:
+            error_list.append(f"- {err.get('type', 'error')}: '{err.get('incorrect', '')}' should be '{err.get('correction', '')}'")
+        error_description = "The child made these errors:\n" + "\n".join(error_list)
+
+    return f"""
+You are a creative children's story writer and speech therapist.
+
+Create a SHORT story (3 sentences) for a 4-6 year old child about: {subject}
+
+IMPORTANT REQUIREMENTS:
+1. The story MUST naturally incorporate and repeatedly use the words/sounds the child struggled with
+2. Make the story engaging, fun, and age-appropriate, and mostly with simple words adapted for young children.
+3. {error_description}
+4. Use simple vocabulary but strategically include the correction words from the errors
+5. Break the story into very short sections (1-2 sentences each) separated by a pipe symbol |
+
+The child said: "{transcript}"
+
+Generate the story with sections separated by | (pipe symbol).
+Example format: "Once upon a time, there was a happy dog. | The dog loved to play. | One day, the dog found a ball."
+
+Return ONLY the story text with | separators, no other commentary.
+"""
+
+
+def combined_prompt(subject, transcript):
+    return f"""
+You are a speech therapist and creative children's story writer helping a child aged 4-6 years.
+
+The child was shown a picture of: {subject}
+The child said: \"{transcript}\"
+
+Step 1. Analyze the child's sentence for:
+1. Grammar errors and corrections
+2. Vocabulary errors and corrections
+3. Simple articulation errors that can be inferred from the text
+
+Step 2. Create a SHORT story (3 sentences) about: {subject}
+1. The story MUST naturally incorporate and repeatedly use the correction words from Step 1
+2. Make the story engaging, fun, and age-appropriate, with simple words adapted for young children
+3. Break the story into very short sections (1-2 sentences each) separated by a pipe symbol |
+
+Return ONLY a JSON object with two keys:
+- "errors": an array where each element has type ("grammar", "vocabulary" or "articulation"),
+  incorrect, correction and explanation (short child-friendly explanation, max 15 words).
+  Use an empty array if there are no errors.
+- "story": the story text with sections separated by |
+"""
+
+
+def strip_code_fence(text):
+    """Remove a ```json ... ``` wrapper the model sometimes adds"""
+    text = text.strip()
+    if text.startswith('```'):
+        lines = text.split('\n')
+        text = '\n'.join(lines[1:-1])
+        if text.startswith('json'):
+            text = text[4:].strip()
+    return text
+
+
+def detect_errors(transcript):
+    """Ask the model for the child's errors; raises json.JSONDecodeError on a bad reply"""
+    with telemetry.span("detect_errors", transcript_chars=len(transcript)) as span:
+        backend = get_backend()
+        model = cache_model(backend)
+        cache = response_cache.get_cache()
+        if cache is not None:
+            cached = cache.get("errors", transcript, model=model)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+
+        response_text = backend.generate(error_prompt(transcript), kind="errors")
+        errors = json.loads(strip_code_fence(response_text))
+
+        if cache is not None:
+            cache.put("errors", transcript, errors, model=model)
+        return errors
+
+
+def generate_story(subject, errors, transcript):
+    """Ask the model for a practice story built around the child's errors"""
+    with telemetry.span("generate_story", transcript_chars=len(transcript), errors=len(errors or [])) as span:
+        backend = get_backend()
+        model = cache_model(backend)
+        cache = response_cache.get_cache()
+        signature = response_cache.error_signature(errors)
+        if cache is not None:
+            cached = cache.get("story", transcript, subject, signature, model=model)
+            if cached is not None:
+                span.set(cached=True)
+                return cached
+
+        story = backend.generate(story_prompt(subject, errors, transcript), kind="story")
+        story = strip_code_fence(story)
+
+        if cache is not None and story:
+            cache.put("story", transcript, story, subject, signature, model=model)
+        return story
+
+
+def detect_errors_and_generate_story(subject, transcript):
+    """Get errors and story from one structured request"""
+    with telemetry.span("errors_and_story", transcript_chars=len(transcript)) as span:
+        backend = get_backend()
+        model = cache_model(backend)
+        cache = response_cache.get_cache()
+        if cache is not None:
+            errors = cache.get("errors", transcript, model=model)
+            if errors is not None:
+                story = cache.get("story", transcript, subject, response_cache.error_signature(errors), model=model)
+                if story is not None:
+                    span.set(cached=True)
+                    return errors, story
+
+        response_text = backend.generate(combined_prompt(subject, transcript), kind="combined")
+        data = json.loads(strip_code_fence(response_text))
+        errors, story = data.get('errors') or [], (data.get('story') or "").strip()
+
+        if cache is not None:
+            cache.put("errors", transcript, errors, model=model)
+            if story:
+                cache.put("story", transcript, story, subject, response_cache.error_signature(errors), model=model)
+        return errors, story
+
+
+def run_pipeline(subject, transcript, mode=None):
+    """Detect errors and generate the practice story in the configured mode
+
+    - sequential: error request, then a story request that uses its errors
+    - combined: both in a single structured request (one round trip)
+
+    There is no speculative mode that writes the story alongside error
+    detection: without the errors the story cannot practise them, so it was
+    thrown away for nearly every child who made one (2 of 8 kept in
+    benchmarks/bench_llm_pipeline.py), costing an extra request for no gain.
+
+    Returns a dict with `errors`, `story`, `issues` (messages for the user
+    about steps that failed) and timing details.
+    """
+    mode = mode or config.LLM_PIPELINE
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"Unknown LLM pipeline mode {mode!r}; expected one of {PIPELINE_MODES}")
+
+    start = time.perf_counter()
+    result = {'errors': [], 'story': "", 'issues': [], 'mode': mode, 'round_trips': 0}
+
+    if mode == "combined":
+        try:
+            result['round_trips'] += 1
+            result['errors'], result['story'] = detect_errors_and_generate_story(subject, transcript)
+        except Exception as e:
+            # Fall back to the two-step flow rather than leaving the child without a story
+            logger.warning("Combined LLM request failed, falling back to sequential: %s", e)
+            mode = "sequential"
+
+    if mode == "sequential":
+        result['errors'] = _safe_detect_errors(transcript, result)
+        result['story'] = _safe_generate_story(subject, result['errors'], transcript, result)
+
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def _safe_detect_errors(transcript, result):
+    result['round_trips'] += 1
+    try:
+        return detect_errors(transcript)
+    except json.JSONDecodeError as e:
+        result['issues'].append(f"Error parsing AI response as JSON: {e}")
+    except Exception as e:
+        result['issues'].append(f"Error calling AI: {e}")
+    return []
+
+
+def _safe_generate_story(subject, errors, transcript, result):
+    result['round_trips'] += 1
+    try:
+        return generate_story(subject, errors, transcript)
+    except Exception as e:
+        result['issues'].append(f"Error generating story: {e}")
+    return ""
+
+
+def _quoted_transcript(prompt):
+    match = re.search(r'(?:said: )?"([^"]*)"', prompt)
+    return match.group(1) if match else prompt
@@ -0,0 +1,51 @@
+import streamlit as st
+import pandas as pd
+
+import config
+import telemetry
+
+st.title("Latency")
+
+if not config.TELEMETRY_ADMIN:
+    st.info("The admin page is disabled (TELEMETRY_ADMIN=false).")
+    st.stop()
+
+source = st.radio("Spans", ["Since the app started", "Whole metrics file"], horizontal=True)
+
+if source == "Whole metrics file":
+    try:
+        collector = telemetry.replay(config.TELEMETRY_FILE)
+    except FileNotFoundError:
+        st.info(f"No metrics file at {config.TELEMETRY_FILE} yet.")
+        st.stop()
+else:
+    collector = telemetry.get_telemetry()
+
+summary = collector.summary()
+if not summary:
+    st.info("No spans recorded yet. Run a session first!")
+    st.stop()
+
+st.subheader("Per-stage latency (ms)")
+rows = []
+for stage, stats in summary.items():
+    rows.append({
+        'Stage': stage,
+        'Count': stats['count'],
+        'Errors': stats['errors'],
+        'Mean': stats['mean'] * 1000,
+        'p50': stats['p50'] * 1000,
+        'p95': stats['p95'] * 1000,
+        'p99': stats['p99'] * 1000,
+    })
+st.dataframe(pd.DataFrame(rows).round(1), use_container_width=True, hide_index=True)
+
+st.subheader(f"Slow spans (over {config.TELEMETRY_SLOW_SECONDS:g}s)")
+slow = collector.slow_spans()
+if slow:
+    st.dataframe(pd.DataFrame(slow), use_container_width=True, hide_index=True)
+else:
+    st.caption("None so far.")
+
+with st.expander("Prometheus text"):
+    st.code(collector.prometheus_text(), language="text")
@@ -0,0 +1,252 @@
+"""
+Picture catalog for StoryWeaver
+Indexes the picture folder once and keeps each picture's metadata (subject,
+tags, difficulty, weight) and a downscaled JPEG in memory, so choosing and
+showing a picture touches neither the directory listing nor the original
+full-resolution file. The index is rebuilt when the folder, its metadata
+file or one of its pictures changes.
+
+Metadata is optional and lives in `catalog.json` inside the picture folder:
+
+    {"dog.jpg": {"subject": "dog", "tags": ["animal", "pet"], "difficulty": 1, "weight": 2}}
+
+Pictures without an entry use their file name as the subject.
+"""
+
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp")
+METADATA_FILE = "catalog.json"
+_EXIF_ORIENTATION = 0x0112
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+class Picture:
+    """One catalog entry; `data` holds the downscaled image bytes"""
+
+    def __init__(self, file, subject, tags=(), difficulty=1, weight=1.0):
+        self.file = file
+        self.subject = subject
+        self.tags = tuple(tags)
+        self.difficulty = difficulty
+        self.weight = weight
+        self.data = None
+        self.signature = None
+
+
+class PictureCatalog:
+    """In-memory picture index with weighted selection that avoids repeats"""
+
+    def __init__(self, folder=None, max_size=None, recheck_seconds=None):
+        self.folder = folder or config.PICTURE_FOLDER
+        self.max_size = max_size or config.PICTURE_MAX_SIZE
+        self.recheck_seconds = recheck_seconds if recheck_seconds is not None else config.PICTURE_RECHECK_SECONDS
+
+        self._lock = threading.Lock()
+        self._pictures = {}
+        self._folder_signature = None
+        self._checked_at = 0.0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Rebuild the index if the folder, its metadata or a picture changed
+
+        Each picture is stat'ed too, because replacing a file in place does
+        not change the folder; pictures whose size and modification time are
+        unchanged keep their resized bytes.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.recheck_seconds:
+            return False
+
+        with self._lock:
+            self._checked_at = now
+            signature = (_stat_signature(self.folder), _stat_signature(os.path.join(self.folder, METADATA_FILE)))
+            if not force and signature == self._folder_signature and not self._pictures_changed():
+                return False
+
+            metadata = self._load_metadata()
+            pictures = {}
+            try:
+                names = sorted(os.listdir(self.folder))
+            except FileNotFoundError:
+                names = []
+            for name in names:
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                path = os.path.join(self.folder, name)
+                entry = metadata.get(name, {})
+                picture = Picture(
+                    name,
+                    entry.get('subject') or os.path.splitext(name)[0],
+                    entry.get('tags', ()),
+                    _number(int, entry.get('difficulty'), 1),
+                    _number(float, entry.get('weight'), 1.0),
+                )
+                picture.signature = _stat_signature(path)
+                previous = self._pictures.get(name)
+                if previous is not None and previous.signature == picture.signature:
+                    picture.data = previous.data
+                else:
+                    picture.data = self._resize(path)
+                if picture.data is None:
+                    # Deleted or unreadable since the folder was listed
+                    continue
+                pictures[name] = picture
+
+            self._pictures = pictures
+            self._folder_signature = signature
+            logger.info("Picture catalog indexed %d pictures from %s", len(pictures), self.folder)
+            return True
+
+    def pictures(self, difficulty=None, tag=None):
+        """Return catalog entries, optionally filtered by difficulty or tag"""
+        self.refresh()
+        return [
+            picture for picture in self._pictures.values()
+            if (difficulty is None or picture.difficulty == difficulty) and (tag is None or tag in picture.tags)
+        ]
+
+    def choose(self, recent_subjects=(), difficulty=None, tag=None, rng=random):
+        """Pick a picture at random by weight, skipping recently shown subjects
+
+        When every candidate was shown recently, only the most recent
+        subject is avoided. Returns None when the catalog is empty.
+        """
+        candidates = self.pictures(difficulty, tag) or self.pictures()
+        if not candidates:
+            return None
+
+        recent = set(recent_subjects)
+        fresh = [picture for picture in candidates if picture.subject not in recent]
+        if not fresh and recent_subjects:
+            fresh = [picture for picture in candidates if picture.subject != recent_subjects[-1]]
+        fresh = fresh or candidates
+        weights = [max(picture.weight, 0.0) for picture in fresh]
+        return rng.choices(fresh, weights=weights if any(weights) else None)[0]
+
+    def get(self, file):
+        """Return the entry for `file`, or None if it is no longer in the folder"""
+        self.refresh()
+        return self._pictures.get(file)
+
+    def image_bytes(self, file):
+        """Downscaled image bytes for `file` (the original bytes if it could not be resized)"""
+        picture = self.get(file)
+        return picture.data if picture is not None else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pictures': len(self._pictures),
+                'image_bytes': sum(len(picture.data or b"") for picture in self._pictures.values()),
+            }
+
+    def _pictures_changed(self):
+        return any(_stat_signature(os.path.join(self.folder, name)) != picture.signature
+                   for name, picture in self._pictures.items())
+
+    def _load_metadata(self):
+        path = os.path.join(self.folder, METADATA_FILE)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable picture metadata %s: %s", path, e)
+            return {}
+
+    def _resize(self, path):
+        try:
+            with open(path, "rb") as f:
+                original = f.read()
+        except OSError as e:
+            logger.warning("Skipping unreadable picture %s: %s", path, e)
+            return None
+        try:
+            from PIL import Image, ImageOps
+        except ImportError:
+            return original
+
+        try:
+            with Image.open(io.BytesIO(original)) as image:
+                upright = image.getexif().get(_EXIF_ORIENTATION, 1) == 1
+                if max(image.size) <= self.max_size and image.format == "JPEG" and upright:
+                    return original
+                # Phone photos are stored sideways with an EXIF rotation tag
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((self.max_size, self.max_size))
+                buffer = io.BytesIO()
+                _flatten(image).save(buffer, format="JPEG", quality=82, optimize=True)
+        except OSError as e:
+            logger.warning("Could not resize %s, serving the original: %s", path, e)
+            return original
+        # Small or already well-compressed files can grow when re-encoded, but
+        # the original of a rotated photo would show sideways
+        return buffer.getvalue() if len(buffer.getvalue()) < len(original) or not upright else original
+
+
+def _number(convert, value, default):
+    """`value` as int or float, or `default` when it is missing or not a number"""
+    try:
+        return convert(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _flatten(image):
+    """RGB copy of `image` with any transparency on white rather than black"""
+    from PIL import Image
+
+    if image.mode not in ("RGBA", "LA", "PA") and "transparency" not in image.info:
+        return image.convert("RGB")
+    rgba = image.convert("RGBA")
+    background = Image.new("RGB", rgba.size, (255, 255, 255))
+    background.paste(rgba, mask=rgba.getchannel("A"))
+    return background
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_catalog():
+    """Return the process-wide picture catalog, building it on first use"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = PictureCatalog()
+    return _catalog
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the picture catalog and its resized sizes")
+    parser.add_argument("--folder", default=None, help="Picture folder (default: config.PICTURE_FOLDER)")
+    args = parser.parse_args()
+
+    catalog = PictureCatalog(args.folder)
+    for picture in catalog.pictures():
+        original = os.path.getsize(os.path.join(catalog.folder, picture.file))
+        print(f"{picture.file:24} {picture.subject:12} difficulty={picture.difficulty} "
+              f"weight={picture.weight:g} {original / 1024:.0f} KB -> {len(picture.data) / 1024:.0f} KB")
+    print(json.dumps(catalog.stats(), indent=2))
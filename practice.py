@@ -0,0 +1,139 @@
+"""
+Background checking of practice attempts for StoryWeaver
+A recorded attempt is decoded, silence-trimmed, transcribed and scored on a
+shared thread pool, so the Streamlit script thread only submits the work and
+polls for the result. Checks are keyed by a hash of the recording, which
+lets reruns that see the same recording find the running check instead of
+starting another one.
+"""
+
+import contextvars
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import asr
+import asr_service
+import audio
+import config
+import scoring
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+HIGHLIGHT = '<span style="background-color: #ffeb3b; font-weight: bold; padding: 2px 4px; border-radius: 3px;">{}</span>'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class NoSpeech(Exception):
+    """Raised when a recording contains nothing to transcribe"""
+
+
+class Check:
+    """One recording being checked against a story section
+
+    `partial` holds the text heard so far while Whisper works; `recorded`
+    is set by the app once the attempt has been added to the session.
+    """
+
+    def __init__(self, key, section, reference):
+        self.key = key
+        self.section = section
+        self.reference = reference
+        self.partial = ""
+        self.recorded = False
+        self.future = None
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """Dict with `status` (done, no_speech, busy or error), plus `transcript` and `score` when done"""
+        return self.future.result()
+
+
+def audio_key(audio_bytes):
+    return hashlib.sha1(audio_bytes).hexdigest()
+
+
+def recognize(audio_bytes, backend):
+    """Decode, trim and transcribe recorder WAV bytes; returns the Whisper result
+
+    Raises NoSpeech when the VAD finds no speech (ASR is never called) and
+    asr_service.ASRQueueFull when the worker pool is saturated.
+    """
+    with telemetry.span("audio_decode", audio_bytes=len(audio_bytes)):
+        samples = audio.decode_wav_bytes(audio_bytes)
+    if config.VAD_ENABLED:
+        # Silence costs Whisper time and invites made-up text
+        with telemetry.span("vad") as span:
+            samples, vad = audio.trim_silence(samples)
+            span.set(input_seconds=round(vad['input_seconds'], 2), removed_seconds=round(vad['removed_seconds'], 2))
+        if not vad['speech']:
+            raise NoSpeech()
+
+    # The recorder hands over the finished clip, so one decode of the whole
+    # clip is all the work there is; windowed decodes would only repeat it
+    with telemetry.span("transcribe", audio_seconds=round(len(samples) / asr.SAMPLE_RATE, 2)) as span:
+        result = backend.transcribe(samples)
+        span.set(transcript_chars=len(result.get("text", "").strip()))
+    return result
+
+
+def check(audio_bytes, section, reference, focus_words, get_backend):
+    """Start checking one attempt in the background and return its Check
+
+    `get_backend` is called on the worker thread, so waiting for a model
+    that is still loading never holds up the page.
+    """
+    attempt = Check(audio_key(audio_bytes), section, reference)
+    # Run in a copy of this context so the spans keep the session id
+    attempt.future = get_executor().submit(
+        contextvars.copy_context().run, _check, attempt, audio_bytes, focus_words, get_backend
+    )
+    return attempt
+
+
+def highlight(text, errors):
+    """Return (html with corrections highlighted, corrections found in `text`)"""
+    highlighted_text = text
+    focus_words = []
+    for err in errors or []:
+        correction = err.get('correction', '').lower()
+        if correction and correction in text.lower():
+            focus_words.append(correction)
+            highlighted_text = highlighted_text.replace(correction, HIGHLIGHT.format(correction))
+    return highlighted_text, focus_words
+
+
+def get_executor():
+    """Return the process-wide pool shared by every session's checks"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.PRACTICE_WORKERS, thread_name_prefix="practice")
+    return _executor
+
+
+def _check(attempt, audio_bytes, focus_words, get_backend):
+    def on_partial(text):
+        attempt.partial = text
+
+    try:
+        result = recognize(audio_bytes, get_backend(), on_partial)
+    except NoSpeech:
+        return {'status': "no_speech"}
+    except asr_service.ASRQueueFull:
+        return {'status': "busy"}
+    except Exception as e:
+        logger.exception("Checking a practice attempt failed")
+        return {'status': "error", 'error': str(e)}
+
+    transcript = result.get("text", "").strip()
+    with telemetry.span("scoring", reference_words=len(attempt.reference.split()), transcript_chars=len(transcript)):
+        score = scoring.score(attempt.reference, transcript, focus_words=focus_words)
+    return {'status': "done", 'transcript': transcript, 'score': score}
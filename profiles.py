@@ -0,0 +1,200 @@
+"""
+Child and therapist profiles for StoryWeaver
+Profiles live in their own small SQLite database. Each child's sessions are
+stored in a progress shard named after the child's profile id (see
+progress_store.ShardedProgressStore). Listing is paginated by name, so the
+sidebar only reads one page of children even when thousands share a host.
+The "default" profile holds every session saved before profiles existed.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE = "default"
+KINDS = ("child", "therapist")
+
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_registry = None
+_registry_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    profile_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    therapist_id TEXT,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS profiles_name ON profiles (kind, name, profile_id);
+CREATE INDEX IF NOT EXISTS profiles_therapist ON profiles (therapist_id, name, profile_id);
+"""
+
+
+def check_profile_id(profile_id):
+    """Raise ValueError unless `profile_id` is safe to use as a file name"""
+    if not isinstance(profile_id, str) or not _PROFILE_ID.match(profile_id):
+        raise ValueError(f"Invalid profile id: {profile_id!r}")
+    return profile_id
+
+
+class ProfileRegistry:
+    """Profiles of the children (and their therapists) using one host"""
+
+    def __init__(self, path=None):
+        self.path = path or config.PROFILES_DB
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            db.execute(
+                "INSERT OR IGNORE INTO profiles VALUES (?, ?, 'child', NULL, ?)",
+                (DEFAULT_PROFILE, config.DEFAULT_PROFILE_NAME, _now()),
+            )
+
+    def create(self, name, kind="child", therapist_id=None):
+        """Add a profile with a new id derived from `name`; returns it"""
+        name = name.strip()
+        if not name:
+            raise ValueError("A profile needs a name")
+        slug = re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or kind
+        profile = {
+            'profile_id': f"{slug}-{uuid.uuid4().hex[:8]}",
+            'name': name,
+            'kind': kind,
+            'therapist_id': therapist_id,
+            'created': _now(),
+        }
+        self.upsert(profile)
+        return profile
+
+    def upsert(self, profile):
+        """Insert or update a profile dict as produced by `get`"""
+        check_profile_id(profile['profile_id'])
+        if profile.get('kind', "child") not in KINDS:
+            raise ValueError(f"Unknown profile kind: {profile.get('kind')!r}")
+        with self._connect() as db:
+            db.execute(
+                "INSERT INTO profiles VALUES (?, ?, ?, ?, ?) ON CONFLICT(profile_id) DO UPDATE SET "
+                "name = excluded.name, kind = excluded.kind, therapist_id = excluded.therapist_id",
+                (profile['profile_id'], profile.get('name') or profile['profile_id'], profile.get('kind', "child"),
+                 profile.get('therapist_id'), profile.get('created') or _now()),
+            )
+
+    def get(self, profile_id):
+        row = self._connect().execute(
+            "SELECT profile_id, name, kind, therapist_id, created FROM profiles WHERE profile_id = ?", (profile_id,)
+        ).fetchone()
+        return _profile(row) if row else None
+
+    def page(self, kind="child", therapist_id=None, name_prefix=None, limit=50, after=None):
+        """Return up to `limit` profiles ordered by name, and the cursor for the next page
+
+        `after` is the cursor returned with the previous page; the cursor is
+        None once there are no more profiles.
+        """
+        clauses, params = [], []
+        if kind is not None:
+            clauses.append("kind = ?")
+            params.append(kind)
+        if therapist_id is not None:
+            clauses.append("therapist_id = ?")
+            params.append(therapist_id)
+        if name_prefix:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(re.sub(r"([%_\\])", r"\\\1", name_prefix) + "%")
+        if after is not None:
+            clauses.append("(name, profile_id) > (?, ?)")
+            params.extend(after)
+
+        sql = "SELECT profile_id, name, kind, therapist_id, created FROM profiles"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY name, profile_id LIMIT ?"
+        rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+        profiles = [_profile(row) for row in rows[:limit]]
+        cursor = (profiles[-1]['name'], profiles[-1]['profile_id']) if len(rows) > limit else None
+        return profiles, cursor
+
+    def iter_profiles(self, batch_size=500):
+        """Yield every profile without loading them all"""
+        after = None
+        while True:
+            profiles, after = self.page(kind=None, limit=batch_size, after=after)
+            yield from profiles
+            if after is None:
+                return
+
+    def count(self, kind=None):
+        if kind is None:
+            return self._connect().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+        return self._connect().execute("SELECT COUNT(*) FROM profiles WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def _connect(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            self._local.db = db
+        return db
+
+
+def _profile(row):
+    profile_id, name, kind, therapist_id, created = row
+    return {'profile_id': profile_id, 'name': name, 'kind': kind, 'therapist_id': therapist_id, 'created': created}
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def get_registry():
+    """Return the process-wide profile registry"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ProfileRegistry()
+    return _registry
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Manage StoryWeaver child and therapist profiles")
+    parser.add_argument("--db", default=None, help="Profiles database (default: config.PROFILES_DB)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="Create a profile and print it")
+    add_parser.add_argument("name")
+    add_parser.add_argument("--kind", choices=KINDS, default="child")
+    add_parser.add_argument("--therapist", default=None, help="Therapist profile id for a child")
+
+    list_parser = commands.add_parser("list", help="Print profiles as JSON lines, ordered by name")
+    list_parser.add_argument("--kind", choices=KINDS, default=None)
+    list_parser.add_argument("--therapist", default=None)
+    list_parser.add_argument("--prefix", default=None, help="Only names starting with this")
+
+    args = parser.parse_args()
+    registry = ProfileRegistry(args.db)
+
+    if args.command == "add":
+        if args.therapist is not None and registry.get(args.therapist) is None:
+            parser.error(f"no profile {args.therapist!r}")
+        print(json.dumps(registry.create(args.name, args.kind, args.therapist)))
+    elif args.command == "list":
+        after = None
+        while True:
+            page, after = registry.page(args.kind, args.therapist, args.prefix, limit=500, after=after)
+            for profile in page:
+                print(json.dumps(profile))
+            if after is None:
+                break
@@ -0,0 +1,722 @@
+"""
+Progress storage for StoryWeaver
+Sessions are appended to a SQLite database (WAL mode) instead of rewriting
+one JSON file, so saving is O(1), writes are atomic and crash-safe, and
+several app processes can share the same store. Each session keeps the
+exact schema the app has always written; date and subject are indexed.
+Running totals for the sidebar are updated in the same transaction as each
+append, so reading them never touches the session history. Sessions are
+committed by session id, so saving the same session twice is a no-op.
+
+Each child profile gets its own store file (ShardedProgressStore), so a
+child's totals and history never mix with anyone else's. The whole set of
+shards can be exported to and imported from one JSON-lines stream.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import config
+import profiles
+
+logger = logging.getLogger(__name__)
+
+_shards = None
+_shards_lock = threading.Lock()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    average_accuracy REAL NOT NULL,
+    data TEXT NOT NULL,
+    session_id TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_date ON sessions (date);
+CREATE INDEX IF NOT EXISTS sessions_subject ON sessions (subject, date);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day TEXT PRIMARY KEY,
+    sessions INTEGER NOT NULL,
+    accuracy_sum REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS recent_accuracy (
+    session_id INTEGER PRIMARY KEY,
+    accuracy REAL NOT NULL
+);
+"""
+
+
+class ProgressStore:
+    """Append-only session store backed by SQLite"""
+
+    def __init__(self, path=None, rolling_sessions=None, rolling_days=None):
+        self.path = path or config.PROGRESS_DB
+        self.rolling_sessions = rolling_sessions or config.PROGRESS_ROLLING_SESSIONS
+        self.rolling_days = rolling_days or config.PROGRESS_ROLLING_DAYS
+        self._local = threading.local()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+            upgraded = self._add_session_ids(db)
+            db.execute("CREATE UNIQUE INDEX IF NOT EXISTS sessions_session_id ON sessions (session_id)")
+        # Databases written before aggregates existed get them computed once
+        if upgraded or (self.count() and self._counter("sessions") == 0):
+            self.rebuild_aggregates()
+
+    def commit_session(self, session_data):
+        """Store a finished session exactly once
+
+        Returns the new row id, or None if a session with the same session id
+        (see `session_key`) was already committed.
+        """
+        with self._connect() as db:
+            return self._insert(db, session_data)
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def summary(self, today=None):
+        """Return the running aggregates in O(1) of the session history
+
+        Includes totals, per-subject and per-error-type counts, the mean
+        accuracy of the last `rolling_sessions` sessions and totals for the
+        last `rolling_days` days.
+        """
+        db = self._connect()
+        counters = dict(db.execute("SELECT name, value FROM counters"))
+        sessions = int(counters.get("sessions", 0))
+        recent_count = int(counters.get("recent_count", 0))
+
+        today = today or datetime.now().date()
+        first_day = (today - timedelta(days=self.rolling_days - 1)).isoformat()
+        window_sessions, window_sum = db.execute(
+            "SELECT COALESCE(SUM(sessions), 0), COALESCE(SUM(accuracy_sum), 0) FROM daily_totals WHERE day >= ?",
+            (first_day,),
+        ).fetchone()
+
+        return {
+            'total_sessions': sessions,
+            'total_attempts': int(counters.get("attempts", 0)),
+            'average_accuracy': counters.get("accuracy_sum", 0) / sessions if sessions else 0,
+            'subjects': _prefixed(counters, "subject:"),
+            'error_types': _prefixed(counters, "error_type:"),
+            'recent_sessions': recent_count,
+            'recent_average_accuracy': counters.get("recent_sum", 0) / recent_count if recent_count else 0,
+            'window_days': self.rolling_days,
+            'window_sessions': window_sessions,
+            'window_average_accuracy': window_sum / window_sessions if window_sessions else 0,
+        }
+
+    def average_accuracy(self):
+        """Mean of the per-session average accuracy (0 when there are no sessions)"""
+        return self.summary()['average_accuracy']
+
+    def recent(self, limit=5):
+        """Return the newest `limit` sessions, newest first"""
+        return self.page(limit)[0]
+
+    def page(self, limit=5, before=None):
+        """Return up to `limit` sessions, newest first, and the cursor for the next (older) page
+
+        `before` is the cursor returned with the previous page; the cursor is
+        None once there are no older sessions.
+        """
+        if before is None:
+            rows = self._connect().execute(
+                "SELECT id, data FROM sessions ORDER BY id DESC LIMIT ?", (limit + 1,)
+            ).fetchall()
+        else:
+            rows = self._connect().execute(
+                "SELECT id, data FROM sessions WHERE id < ? ORDER BY id DESC LIMIT ?", (before, limit + 1)
+            ).fetchall()
+        cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], cursor
+
+    def query(self, subject=None, date_from=None, date_to=None, limit=None):
+        """Return sessions filtered by subject and/or date range, oldest first
+
+        Dates compare as the stored "YYYY-MM-DD HH:MM:SS" strings, so a plain
+        "YYYY-MM-DD" works as a lower bound and "YYYY-MM-DD~" as an upper one.
+        """
+        clauses, params = [], []
+        if subject is not None:
+            clauses.append("subject = ?")
+            params.append(subject)
+        if date_from is not None:
+            clauses.append("date >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            clauses.append("date <= ?")
+            params.append(date_to)
+
+        sql = "SELECT data FROM sessions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY date, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(data) for (data,) in self._connect().execute(sql, params)]
+
+    def iter_sessions(self, batch_size=500):
+        """Yield every stored session in insertion order without loading them all"""
+        last_id = 0
+        db = self._connect()
+        while True:
+            rows = db.execute(
+                "SELECT id, data FROM sessions WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for row_id, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+    def import_sessions(self, sessions):
+        """Append many sessions in a single transaction; returns how many"""
+        imported = 0
+        with self._connect() as db:
+            for session in sessions:
+                if self._insert(db, session) is not None:
+                    imported += 1
+        return imported
+
+    def dedupe(self, dry_run=False):
+        """Remove rows that repeat an earlier session id; returns how many"""
+        db = self._connect()
+        duplicates = db.execute(
+            "SELECT COUNT(*) FROM sessions WHERE id NOT IN (SELECT MIN(id) FROM sessions GROUP BY session_id)"
+        ).fetchone()[0]
+        if duplicates and not dry_run:
+            with db:
+                _delete_duplicate_rows(db)
+            self.rebuild_aggregates()
+            db.execute("VACUUM")
+        return duplicates
+
+    def rebuild_aggregates(self, write=True):
+        """Recompute aggregates from the raw sessions and compare with the stored ones
+
+        Returns a list of (name, stored, recomputed) for every value that
+        differs. With `write`, the stored aggregates are replaced afterwards.
+        """
+        db = self._connect()
+        stored = self._aggregate_snapshot(db)
+
+        # Recompute inside a savepoint on the same tables, then keep or discard it
+        db.execute("SAVEPOINT rebuild")
+        try:
+            db.execute("DELETE FROM counters")
+            db.execute("DELETE FROM daily_totals")
+            db.execute("DELETE FROM recent_accuracy")
+            for row_id, data in db.execute("SELECT id, data FROM sessions ORDER BY id").fetchall():
+                self._add_to_aggregates(db, row_id, json.loads(data))
+            rebuilt = self._aggregate_snapshot(db)
+        except Exception:
+            db.execute("ROLLBACK TO rebuild")
+            db.execute("RELEASE rebuild")
+            raise
+
+        if not write:
+            db.execute("ROLLBACK TO rebuild")
+        db.execute("RELEASE rebuild")
+        db.commit()
+
+        mismatches = []
+        for name in sorted(stored.keys() | rebuilt.keys()):
+            old, new = stored.get(name, 0), rebuilt.get(name, 0)
+            if abs(old - new) > 1e-6:
+                mismatches.append((name, old, new))
+        return mismatches
+
+    def _insert(self, db, session_data):
+        cursor = db.execute(
+            "INSERT OR IGNORE INTO sessions (date, subject, average_accuracy, data, session_id) "
+            "VALUES (?, ?, ?, ?, ?)",
+            _row(session_data),
+        )
+        if cursor.rowcount == 0:
+            return None
+        self._add_to_aggregates(db, cursor.lastrowid, session_data)
+        return cursor.lastrowid
+
+    def _add_session_ids(self, db):
+        # Stores created before session ids: backfill them and drop the
+        # duplicate rows that repeated saves left behind
+        columns = [row[1] for row in db.execute("PRAGMA table_info(sessions)")]
+        if "session_id" in columns:
+            return False
+        db.execute("ALTER TABLE sessions ADD COLUMN session_id TEXT")
+        rows = db.execute("SELECT id, data FROM sessions").fetchall()
+        db.executemany("UPDATE sessions SET session_id = ? WHERE id = ?",
+                       [(session_key(json.loads(data)), row_id) for row_id, data in rows])
+        removed = _delete_duplicate_rows(db)
+        if removed:
+            logger.info("Removed %d duplicate sessions from %s", removed, self.path)
+        return True
+
+    def _add_to_aggregates(self, db, row_id, session):
+        accuracy = float(session.get('average_accuracy', 0) or 0)
+        increments = {
+            "sessions": 1,
+            "accuracy_sum": accuracy,
+            "attempts": session.get('total_attempts', 0) or 0,
+            f"subject:{session.get('subject', '')}": 1,
+        }
+        for err in session.get('errors_detail') or []:
+            name = f"error_type:{err.get('type', 'unknown')}"
+            increments[name] = increments.get(name, 0) + 1
+
+        # Rolling window over the last N sessions, kept as a small ring table
+        db.execute("INSERT INTO recent_accuracy VALUES (?, ?)", (row_id, accuracy))
+        increments["recent_count"] = 1
+        increments["recent_sum"] = accuracy
+        overflow = db.execute(
+            "SELECT session_id, accuracy FROM recent_accuracy ORDER BY session_id DESC LIMIT -1 OFFSET ?",
+            (self.rolling_sessions,),
+        ).fetchall()
+        for old_id, old_accuracy in overflow:
+            db.execute("DELETE FROM recent_accuracy WHERE session_id = ?", (old_id,))
+            increments["recent_count"] -= 1
+            increments["recent_sum"] -= old_accuracy
+
+        db.executemany(
+            "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            increments.items(),
+        )
+        db.execute(
+            "INSERT INTO daily_totals VALUES (?, 1, ?) ON CONFLICT(day) DO UPDATE SET "
+            "sessions = sessions + 1, accuracy_sum = accuracy_sum + excluded.accuracy_sum",
+            (session.get('date', '')[:10], accuracy),
+        )
+
+    def _aggregate_snapshot(self, db):
+        snapshot = dict(db.execute("SELECT name, value FROM counters"))
+        for day, sessions, accuracy_sum in db.execute("SELECT day, sessions, accuracy_sum FROM daily_totals"):
+            snapshot[f"day:{day}:sessions"] = sessions
+            snapshot[f"day:{day}:accuracy_sum"] = accuracy_sum
+        return snapshot
+
+    def _counter(self, name):
+        row = self._connect().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _connect(self):
+        # One connection per thread; Streamlit runs each session in its own thread
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+
+class ShardedProgressStore:
+    """One ProgressStore per profile, each in its own SQLite file
+
+    The default profile stays in PROGRESS_DB, which holds every session
+    saved before profiles existed. Other profiles live in
+    `directory`/<2 hex digits>/<profile id>.sqlite3, so no directory grows
+    past a few hundred files with thousands of children. Every shard keeps
+    its own running totals, so one child's sidebar reads only their rows.
+    At most `max_open` shards are kept open, most recently used first.
+    """
+
+    def __init__(self, directory=None, default_path=None, max_open=None):
+        self.directory = directory or config.PROGRESS_SHARD_DIR
+        self.default_path = default_path or config.PROGRESS_DB
+        self.max_open = max_open or config.PROGRESS_MAX_OPEN_SHARDS
+        self._open = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path_for(self, profile_id):
+        if (profile_id or profiles.DEFAULT_PROFILE) == profiles.DEFAULT_PROFILE:
+            return self.default_path
+        profiles.check_profile_id(profile_id)
+        bucket = hashlib.sha1(profile_id.encode("utf-8")).hexdigest()[:2]
+        return os.path.join(self.directory, bucket, f"{profile_id}.sqlite3")
+
+    def store_for(self, profile_id, create=True):
+        """The store for `profile_id`; None if it has no sessions yet and not `create`"""
+        profile_id = profile_id or profiles.DEFAULT_PROFILE
+        with self._lock:
+            store = self._open.get(profile_id)
+            if store is not None:
+                self._open.move_to_end(profile_id)
+                return store
+
+        path = self.path_for(profile_id)
+        if not os.path.exists(path):
+            if not create:
+                return None
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        store = ProgressStore(path)
+        with self._lock:
+            store = self._open.setdefault(profile_id, store)
+            self._open.move_to_end(profile_id)
+            # Evicted stores close their connections once no thread still uses them
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return store
+
+    def commit_session(self, session_data):
+        """Store a finished session in the shard of its `profile_id`"""
+        return self.store_for(session_data.get('profile_id')).commit_session(session_data)
+
+    def import_sessions(self, sessions):
+        """Append sessions to the shards of their `profile_id`s; returns how many were new"""
+        by_profile = {}
+        for session in sessions:
+            profile_id = profiles.check_profile_id(session.get('profile_id') or profiles.DEFAULT_PROFILE)
+            by_profile.setdefault(profile_id, []).append(session)
+        return sum(self.store_for(profile_id).import_sessions(batch) for profile_id, batch in by_profile.items())
+
+    def profile_ids(self):
+        """Yield the id of every profile that has a shard on disk"""
+        if os.path.exists(self.default_path):
+            yield profiles.DEFAULT_PROFILE
+        if not os.path.isdir(self.directory):
+            return
+        for bucket in sorted(os.listdir(self.directory)):
+            bucket_path = os.path.join(self.directory, bucket)
+            if not os.path.isdir(bucket_path):
+                continue
+            for name in sorted(os.listdir(bucket_path)):
+                if name.endswith(".sqlite3"):
+                    yield name[:-len(".sqlite3")]
+
+    def iter_sessions(self, profile_ids=None, batch_size=500):
+        """Yield (profile id, session) for every stored session, one shard at a time"""
+        for profile_id in profile_ids if profile_ids is not None else self.profile_ids():
+            store = self.store_for(profile_id, create=False)
+            if store is None:
+                continue
+            for session in store.iter_sessions(batch_size):
+                yield profile_id, session
+
+    def export_jsonl(self, f, registry=None, profile_ids=None):
+        """Write profiles and sessions to `f` as JSON lines; returns (profiles, sessions) written
+
+        Sessions are written unchanged inside {"profile_id", "session"}
+        records, so importing an export into the same stores is a no-op.
+        """
+        profile_count = 0
+        if registry is not None:
+            wanted = set(profile_ids) if profile_ids is not None else None
+            for profile in registry.iter_profiles():
+                if wanted is None or profile['profile_id'] in wanted:
+                    f.write(json.dumps({'profile': profile}) + "\n")
+                    profile_count += 1
+        sessions = 0
+        for profile_id, session in self.iter_sessions(profile_ids):
+            f.write(json.dumps({'profile_id': profile_id, 'session': session}) + "\n")
+            sessions += 1
+        return profile_count, sessions
+
+    def import_jsonl(self, f, registry=None, batch_size=500):
+        """Read an export from `f`; returns (profiles, sessions imported, duplicate sessions)
+
+        Sessions are buffered per profile and committed one transaction per
+        shard and batch. At most about ten batches are held in memory, however
+        many profiles the stream contains.
+        """
+        buffers = {}
+        buffered = 0
+        profile_count = imported = duplicates = 0
+
+        def flush(profile_id):
+            nonlocal imported, duplicates, buffered
+            batch = buffers.pop(profile_id)
+            added = self.store_for(profile_id).import_sessions(batch)
+            imported += added
+            duplicates += len(batch) - added
+            buffered -= len(batch)
+
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping damaged line %d of the import", line_number)
+                continue
+            if 'profile' in record:
+                if registry is not None:
+                    registry.upsert(record['profile'])
+                profile_count += 1
+                continue
+
+            session = record['session']
+            profile_id = record.get('profile_id') or session.get('profile_id') or profiles.DEFAULT_PROFILE
+            buffers.setdefault(profiles.check_profile_id(profile_id), []).append(session)
+            buffered += 1
+            if len(buffers[profile_id]) >= batch_size:
+                flush(profile_id)
+            elif buffered >= 10 * batch_size:
+                for pending in sorted(buffers, key=lambda p: len(buffers[p]), reverse=True)[:len(buffers) // 2 + 1]:
+                    flush(pending)
+
+        for profile_id in list(buffers):
+            flush(profile_id)
+        return profile_count, imported, duplicates
+
+
+def session_key(session):
+    """Identity of a session: its session_id, or a content hash for legacy sessions
+
+    Sessions saved before session ids existed were sometimes written several
+    times with identical content, so hashing the content makes those copies
+    collapse into one.
+    """
+    if session.get('session_id'):
+        return session['session_id']
+    canonical = json.dumps(session, sort_keys=True)
+    return "legacy-" + hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]
+
+
+def dedupe_sessions(sessions):
+    """Return `sessions` without repeats (first occurrence wins) and the number dropped"""
+    seen = set()
+    unique = []
+    for session in sessions:
+        key = session_key(session)
+        if key not in seen:
+            seen.add(key)
+            unique.append(session)
+    return unique, len(sessions) - len(unique)
+
+
+def dedupe_json_file(path, dry_run=False):
+    """Remove duplicate sessions from a legacy progress JSON file in place"""
+    sessions = load_json_sessions(path)
+    unique, removed = dedupe_sessions(sessions)
+    if removed and not dry_run:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"sessions": unique}, f, indent=2)
+        os.replace(tmp_path, path)
+    return removed
+
+
+def _delete_duplicate_rows(db):
+    cursor = db.execute(
+        "DELETE FROM sessions WHERE id NOT IN (SELECT MIN(id) FROM sessions GROUP BY session_id)"
+    )
+    return cursor.rowcount
+
+
+def _row(session_data):
+    return (
+        session_data.get('date', ''),
+        session_data.get('subject', ''),
+        float(session_data.get('average_accuracy', 0) or 0),
+        json.dumps(session_data),
+        session_key(session_data),
+    )
+
+
+def _prefixed(counters, prefix):
+    return {name[len(prefix):]: int(value) for name, value in counters.items() if name.startswith(prefix) and value}
+
+
+def iter_json_sessions(path, chunk_size=1 << 20):
+    """Stream sessions from a legacy progress JSON file one at a time
+
+    Accepts the app's {"sessions": [...]} document, a bare list, or an
+    excerpt of comma-separated session objects like data/sample_progress.json.
+    Only about `chunk_size` characters plus one session are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        eof = len(buffer) < chunk_size
+
+        position = _skip(buffer, 0, " \t\r\n")
+        if buffer.startswith('[', position):
+            position += 1
+        elif buffer.startswith('{', position):
+            wrapper = re.match(r'\{\s*"sessions"\s*:\s*\[', buffer[position:])
+            if wrapper:
+                position += wrapper.end()
+
+        while True:
+            position = _skip(buffer, position, " \t\r\n,")
+            if position >= len(buffer):
+                if eof:
+                    return
+                buffer, position = buffer[position:] + f.read(chunk_size), 0
+                eof = eof or len(buffer) < chunk_size
+                continue
+            if buffer[position] in ']}':
+                return
+            try:
+                session, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The next session continues past the buffer: read more and retry
+                more = f.read(chunk_size)
+                eof = len(more) < chunk_size
+                buffer, position = buffer[position:] + more, 0
+                continue
+            yield session
+            buffer, position = buffer[end:], 0
+
+
+def load_json_sessions(path):
+    """Read the sessions list from a legacy progress JSON file"""
+    return list(iter_json_sessions(path))
+
+
+def _skip(text, position, characters):
+    while position < len(text) and text[position] in characters:
+        position += 1
+    return position
+
+
+def migrate_json(json_path, store):
+    """Copy all sessions from a legacy progress JSON file into `store` (a ProgressStore or ShardedProgressStore)"""
+    sessions = load_json_sessions(json_path)
+    imported = store.import_sessions(sessions)
+    logger.info("Imported %d sessions from %s", imported, json_path)
+    return imported
+
+
+def open_export(path, mode):
+    """Open an export file for text `mode` ("r" or "w"), gzip-compressed if it ends in .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def get_shards():
+    """Return the process-wide per-profile progress stores
+
+    The first time PROGRESS_DB is created, an existing PROGRESS_FILE is
+    imported into the default profile so upgrading does not hide earlier
+    sessions.
+    """
+    global _shards
+    if _shards is None:
+        with _shards_lock:
+            if _shards is None:
+                shards = ShardedProgressStore()
+                is_new = not os.path.exists(shards.default_path)
+                store = shards.store_for(profiles.DEFAULT_PROFILE)
+                if is_new and os.path.exists(config.PROGRESS_FILE):
+                    migrate_json(config.PROGRESS_FILE, store)
+                _shards = shards
+    return _shards
+
+
+def get_store(profile_id=None):
+    """Return the progress store of `profile_id` (the default profile when None)"""
+    return get_shards().store_for(profile_id)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage the StoryWeaver progress store")
+    parser.add_argument("--db", default=None, help="Database path (default: config.PROGRESS_DB)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = commands.add_parser("migrate", help="Import legacy progress JSON files")
+    migrate_parser.add_argument("json_files", nargs="+", help="e.g. progress_data.json data/sample_progress.json")
+
+    query_parser = commands.add_parser("query", help="Print stored sessions as JSON")
+    query_parser.add_argument("--subject")
+    query_parser.add_argument("--from", dest="date_from")
+    query_parser.add_argument("--to", dest="date_to")
+    query_parser.add_argument("--limit", type=int)
+    query_parser.add_argument("--profile", default=None, help="Profile id (default: the default profile)")
+
+    dedupe_parser = commands.add_parser("dedupe",
+                                        help="Remove duplicate sessions from the store and/or JSON files")
+    dedupe_parser.add_argument("json_files", nargs="*", help="Legacy progress JSON files to compact in place")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="Only report how many duplicates exist")
+
+    rebuild_parser = commands.add_parser("rebuild-aggregates",
+                                         help="Recompute running totals from the raw sessions")
+    rebuild_parser.add_argument("--check", action="store_true",
+                                help="Only report inconsistencies, do not rewrite the aggregates")
+
+    export_parser = commands.add_parser("export", help="Write profiles and every profile's sessions as JSON lines")
+    export_parser.add_argument("path", help="Output file; compressed when it ends in .gz")
+    export_parser.add_argument("--profile", nargs="*", default=None, help="Only these profile ids")
+
+    import_parser = commands.add_parser("import", help="Read profiles and sessions written by export")
+    import_parser.add_argument("path", help="Input file; .gz files are decompressed")
+    import_parser.add_argument("--batch-size", type=int, default=500, help="Sessions per shard transaction")
+
+    for maintenance_parser in (dedupe_parser, rebuild_parser):
+        maintenance_parser.add_argument("--profile", nargs="*", default=None,
+                                        help="Only these profile ids (default: every shard)")
+
+    # --db is the default profile's shard; every other profile has its own file
+    for shard_parser in (migrate_parser, query_parser, dedupe_parser, rebuild_parser, export_parser, import_parser):
+        shard_parser.add_argument("--shards", default=None,
+                                  help="Shard directory (default: config.PROGRESS_SHARD_DIR)")
+    for registry_parser in (export_parser, import_parser):
+        registry_parser.add_argument("--profiles-db", default=None,
+                                     help="Profiles database (default: config.PROFILES_DB)")
+
+    args = parser.parse_args()
+    shards = ShardedProgressStore(args.shards, args.db)
+
+    if args.command in ("export", "import"):
+        registry = profiles.ProfileRegistry(args.profiles_db)
+        if args.command == "export":
+            with open_export(args.path, "w") as f:
+                written = shards.export_jsonl(f, registry, args.profile)
+            print(f"{args.path}: exported {written[0]} profiles and {written[1]} sessions")
+        else:
+            with open_export(args.path, "r") as f:
+                read, imported, duplicates = shards.import_jsonl(f, registry, args.batch_size)
+            print(f"{args.path}: imported {read} profiles and {imported} sessions "
+                  f"({duplicates} already stored)")
+    elif args.command == "migrate":
+        # Each session goes to the shard of its profile; legacy files have none, so the default one
+        for json_file in args.json_files:
+            print(f"{json_file}: imported {migrate_json(json_file, shards)} sessions")
+    elif args.command == "query":
+        store = shards.store_for(args.profile, create=False)
+        sessions = store.query(args.subject, args.date_from, args.date_to, args.limit) if store else []
+        print(json.dumps({"sessions": sessions}, indent=2))
+    else:
+        # One shard open at a time, however many children there are
+        stores = (shards.store_for(profile_id, create=False) for profile_id in args.profile or shards.profile_ids())
+        stores = (store for store in stores if store is not None)
+
+        if args.command == "dedupe":
+            verb = "found" if args.dry_run else "removed"
+            for json_file in args.json_files:
+                print(f"{json_file}: {verb} {dedupe_json_file(json_file, args.dry_run)} duplicate sessions")
+            for store in stores:
+                print(f"{store.path}: {verb} {store.dedupe(args.dry_run)} duplicate sessions")
+        elif args.command == "rebuild-aggregates":
+            total = checked = 0
+            for store in stores:
+                mismatches = store.rebuild_aggregates(write=not args.check)
+                for name, stored, rebuilt in mismatches:
+                    print(f"{store.path}: {name}: stored {stored:g}, recomputed {rebuilt:g}")
+                total += len(mismatches)
+                checked += 1
+            print(f"{total} inconsistent aggregate(s) in {checked} shard(s)"
+                  + ("" if args.check or not total else " fixed"))
+            if checked == 1:
+                print(json.dumps(store.summary(), indent=2))
@@ -0,0 +1,231 @@
+"""
+Response cache for StoryWeaver's language model calls
+Children often say near-identical sentences about the same picture, so
+error-detection and story replies are stored in SQLite keyed by the
+model that wrote them, the normalized transcript, picture subject and error
+signature, so a reply from one backend or model is never served for another
+(e.g. fake benchmark stories in production). Exact matches
+are served straight from the cache; an optional near-duplicate lookup
+compares character trigrams of transcripts for the same subject. Only story
+replies are matched that way: error detection always needs an exact match,
+because the one word that differs is usually the error.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import config
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Bumped whenever keys change meaning, so older entries stop matching
+_KEY_VERSION = "2"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    transcript TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lookup ON responses (namespace, subject, signature);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def normalize_transcript(text):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s']", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def error_signature(errors):
+    """Order-independent description of a list of detected errors"""
+    parts = sorted(
+        f"{err.get('type', '')}:{normalize_transcript(err.get('incorrect', ''))}>{normalize_transcript(err.get('correction', ''))}"
+        for err in errors or []
+    )
+    return "|".join(parts)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ResponseCache:
+    """Persistent LLM response cache with TTL, LRU size limit and counters"""
+
+    # "wabbit" and "rabbit" are near-duplicates, but not for error detection
+    NEAR_NAMESPACES = ("story",)
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None, similarity_threshold=None):
+        self.path = path or config.RESPONSE_CACHE_PATH
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else config.RESPONSE_CACHE_TTL_HOURS * 3600
+        self.max_entries = max_entries or config.RESPONSE_CACHE_MAX_ENTRIES
+        self.similarity_threshold = (similarity_threshold if similarity_threshold is not None
+                                     else config.RESPONSE_CACHE_SIMILARITY)
+        self.counters = Counter()
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        # (namespace, subject, signature) -> {key: trigram set}, built lazily
+        self._index = None
+
+    def get(self, namespace, transcript, subject="", signature="", model=""):
+        """Return the cached value or None; counts exact, near and missed lookups
+
+        `model` identifies the backend and model; only replies stored with
+        the same `model` are returned.
+        """
+        normalized = normalize_transcript(transcript)
+        scope = _scope(namespace, model)
+        key = self._key(scope, normalized, subject, signature)
+        now = time.time()
+
+        with self._lock:
+            row = self._db.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self._expired(row[1], now):
+                self._touch(key, now)
+                self.counters[f"{namespace}.hits"] += 1
+                return json.loads(row[0])
+
+            if self.similarity_threshold > 0 and namespace in self.NEAR_NAMESPACES:
+                near_key = self._nearest(scope, normalized, subject, signature)
+                if near_key is not None:
+                    row = self._db.execute("SELECT value, created_at FROM responses WHERE key = ?",
+                                           (near_key,)).fetchone()
+                    if row is not None and not self._expired(row[1], now):
+                        self._touch(near_key, now)
+                        self.counters[f"{namespace}.near_hits"] += 1
+                        return json.loads(row[0])
+
+            self.counters[f"{namespace}.misses"] += 1
+            return None
+
+    def put(self, namespace, transcript, value, subject="", signature="", model=""):
+        """Store `value` (anything JSON-serialisable) for this lookup"""
+        normalized = normalize_transcript(transcript)
+        scope = _scope(namespace, model)
+        key = self._key(scope, normalized, subject, signature)
+        now = time.time()
+
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, subject, signature, normalized, json.dumps(value), now, now),
+            )
+            if self._index is not None:
+                self._index.setdefault((scope, subject, signature), {})[key] = trigrams(normalized)
+            self._enforce_limits(now)
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            return {'entries': entries, **self.counters}
+
+    def clear(self):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses")
+            self._index = None
+            self.counters.clear()
+
+    def _key(self, scope, normalized, subject, signature):
+        payload = "\0".join([_KEY_VERSION, scope, subject.lower(), signature, normalized])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def _touch(self, key, now):
+        with self._db:
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+
+    def _nearest(self, scope, normalized, subject, signature):
+        if self._index is None:
+            self._index = {}
+            for key, ns, subj, sig, text in self._db.execute(
+                    "SELECT key, namespace, subject, signature, transcript FROM responses"):
+                self._index.setdefault((ns, subj, sig), {})[key] = trigrams(text)
+
+        query = trigrams(normalized)
+        best_key, best_score = None, self.similarity_threshold
+        for key, grams in self._index.get((scope, subject, signature), {}).items():
+            score = similarity(query, grams)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _enforce_limits(self, now):
+        removed = []
+        if self.ttl_seconds > 0:
+            removed += [row[0] for row in self._db.execute(
+                "SELECT key FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))]
+        count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - len(removed)
+        if count > self.max_entries:
+            removed += [row[0] for row in self._db.execute(
+                "SELECT key FROM responses WHERE created_at >= ? ORDER BY last_used LIMIT ?",
+                (now - self.ttl_seconds if self.ttl_seconds > 0 else 0, count - self.max_entries))]
+        if not removed:
+            return
+
+        self._db.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in removed])
+        if self._index is not None:
+            removed = set(removed)
+            for entries in self._index.values():
+                for key in removed & entries.keys():
+                    del entries[key]
+
+
+def _scope(namespace, model):
+    # Stored in the namespace column, so near-duplicate lookups stay per model
+    return f"{namespace}/{model}" if model else namespace
+
+
+def get_cache():
+    """Return the process-wide response cache, or None when it is disabled"""
+    global _cache
+    if not config.RESPONSE_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                directory = os.path.dirname(config.RESPONSE_CACHE_PATH)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                _cache = ResponseCache()
+    return _cache
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response")
+    args = parser.parse_args()
+
+    cache = ResponseCache()
+    if args.clear:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
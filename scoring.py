@@ -0,0 +1,180 @@
+"""
+Pronunciation scoring for StoryWeaver
+Compares what the child read with the story section word by word: both
+texts are normalized and tokenized, then aligned with a word-level edit
+distance so every reference word is labelled as matched, substituted or
+deleted (missed) and extra spoken words as insertions. Common leading and
+trailing words are matched directly, and the edit distance of the rest is
+computed bit-parallel (Myers/Hyyrö) with one Python integer per reference
+word, so long sections cost a few big-integer operations per word rather
+than one table cell per pair of words.
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z0-9]+)*")
+
+# Whisper often writes small numbers as digits ("4 speedy paws")
+_NUMBER_WORDS = {
+    "0": "zero", "1": "one", "2": "two", "3": "three", "4": "four", "5": "five",
+    "6": "six", "7": "seven", "8": "eight", "9": "nine", "10": "ten",
+    "11": "eleven", "12": "twelve", "13": "thirteen", "14": "fourteen", "15": "fifteen",
+    "16": "sixteen", "17": "seventeen", "18": "eighteen", "19": "nineteen", "20": "twenty",
+}
+
+
+def normalize(text):
+    """Casefold, unify unicode forms and apostrophes"""
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return text.replace("’", "'").replace("‘", "'")
+
+
+def tokenize(text):
+    """Split text into normalized words, ignoring punctuation"""
+    return [_NUMBER_WORDS.get(word, word) for word in _WORD.findall(normalize(text))]
+
+
+def score(reference, spoken, focus_words=None):
+    """Score one attempt
+
+    `focus_words` is an optional list of words or phrases to report
+    separately, e.g. the corrections from detected errors. Returns a dict with:
+    - accuracy: 2 * matched words / (reference words + spoken words) * 100
+    - matches, substitutions, deletions, insertions: alignment counts
+    - word_error_rate: (substitutions + deletions + insertions) / reference words
+    - alignment: list of {op, reference, spoken} in reading order
+    - missed_words: reference words that were substituted or not read
+    - focus_scores: {focus word: 0-100} for focus words in the reference
+    """
+    ref_words, spoken_words = tokenize(reference), tokenize(spoken)
+
+    # Matching words at both ends never change the edit distance, so only
+    # the differing middle goes through the alignment
+    head, tail = _common_ends(ref_words, spoken_words)
+    alignment = [{'op': "match", 'reference': word, 'spoken': word} for word in ref_words[:head]]
+    alignment += _align(ref_words[head:len(ref_words) - tail], spoken_words[head:len(spoken_words) - tail])
+    alignment += [{'op': "match", 'reference': word, 'spoken': word}
+                  for word in ref_words[len(ref_words) - tail:]]
+    return _summarize(alignment, ref_words, spoken_words, focus_words)
+
+
+def _common_ends(ref_words, spoken_words):
+    limit = min(len(ref_words), len(spoken_words))
+    head = 0
+    while head < limit and ref_words[head] == spoken_words[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and ref_words[-1 - tail] == spoken_words[-1 - tail]:
+        tail += 1
+    return head, tail
+
+
+def _align(ref_words, spoken_words):
+    """Minimum edit-distance alignment of two word lists
+
+    Bit j of each vector describes spoken word j. For every reference word
+    i the vertical deltas D[i][j] - D[i][j-1] (vp/vn) and horizontal deltas
+    D[i][j] - D[i-1][j] (hp/hn) are kept, which is all the backtrace needs
+    to walk the table from D[n][m] without ever filling it.
+    """
+    full = (1 << len(spoken_words)) - 1
+    positions = {}
+    for j, word in enumerate(spoken_words):
+        positions[word] = positions.get(word, 0) | (1 << j)
+
+    vp, vn = full, 0
+    vertical = [(vp, vn)]
+    horizontal = [(0, 0)]
+    for word in ref_words:
+        eq = positions.get(word, 0)
+        xv = eq | vn
+        xh = ((((eq & vp) + vp) & full) ^ vp) | eq
+        hp = (vn | ~(xh | vp)) & full
+        hn = vp & xh
+        # Row 0 is D[i][0] = i, so +1 is shifted in at the top
+        shifted_hp = ((hp << 1) | 1) & full
+        vp = ((hn << 1) | ~(xv | shifted_hp)) & full
+        vn = shifted_hp & xv
+        vertical.append((vp, vn))
+        horizontal.append((hp, hn))
+
+    def delta(pair, j):
+        bit = 1 << (j - 1)
+        return 1 if pair[0] & bit else -1 if pair[1] & bit else 0
+
+    # On equal-cost paths, matches come first and substitutions last, so a
+    # misread word tends to pair with the spoken word nearest to it
+    alignment = []
+    i, j = len(ref_words), len(spoken_words)
+    value = i + bin(vp).count("1") - bin(vn).count("1")
+    while i > 0 or j > 0:
+        if i > 0 and j > 0:
+            step = delta(horizontal[i], j)
+            above = value - step
+            diagonal = above - delta(vertical[i - 1], j)
+            if ref_words[i - 1] == spoken_words[j - 1] and value == diagonal:
+                alignment.append({'op': "match", 'reference': ref_words[i - 1], 'spoken': spoken_words[j - 1]})
+                i, j, value = i - 1, j - 1, diagonal
+            elif step == 1:
+                alignment.append({'op': "deletion", 'reference': ref_words[i - 1], 'spoken': None})
+                i, value = i - 1, above
+            elif delta(vertical[i], j) == 1:
+                alignment.append({'op': "insertion", 'reference': None, 'spoken': spoken_words[j - 1]})
+                j, value = j - 1, value - 1
+            else:
+                alignment.append({'op': "substitution", 'reference': ref_words[i - 1], 'spoken': spoken_words[j - 1]})
+                i, j, value = i - 1, j - 1, diagonal
+        elif i > 0:
+            alignment.append({'op': "deletion", 'reference': ref_words[i - 1], 'spoken': None})
+            i -= 1
+        else:
+            alignment.append({'op': "insertion", 'reference': None, 'spoken': spoken_words[j - 1]})
+            j -= 1
+    alignment.reverse()
+    return alignment
+
+
+def _summarize(alignment, ref_words, spoken_words, focus_words):
+    counts = {'match': 0, 'substitution': 0, 'deletion': 0, 'insertion': 0}
+    for step in alignment:
+        counts[step['op']] += 1
+
+    total = len(ref_words) + len(spoken_words)
+    accuracy = 2 * counts['match'] / total * 100 if total else 100.0
+    errors = counts['substitution'] + counts['deletion'] + counts['insertion']
+
+    return {
+        'accuracy': accuracy,
+        'matches': counts['match'],
+        'substitutions': counts['substitution'],
+        'deletions': counts['deletion'],
+        'insertions': counts['insertion'],
+        'word_error_rate': errors / len(ref_words) if ref_words else float(bool(spoken_words)),
+        'alignment': alignment,
+        'missed_words': [step['reference'] for step in alignment if step['op'] in ("substitution", "deletion")],
+        'focus_scores': _focus_scores(alignment, focus_words),
+    }
+
+
+def _focus_scores(alignment, focus_words):
+    """Per-word 0-100 score for each focus word that occurs in the reference"""
+    if not focus_words:
+        return {}
+
+    wanted = {word for phrase in focus_words for word in tokenize(phrase)}
+    scores = {}
+    for step in alignment:
+        word = step['reference']
+        if word not in wanted:
+            continue
+        if step['op'] == "match":
+            value = 100.0
+        elif step['op'] == "substitution":
+            # Partial credit for near misses such as "wabbit" for "rabbit"
+            value = SequenceMatcher(None, word, step['spoken']).ratio() * 100
+        else:
+            value = 0.0
+        scores.setdefault(word, []).append(value)
+    return {word: sum(values) / len(values) for word, values in scores.items()}
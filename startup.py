@@ -0,0 +1,119 @@
+"""
+Background warm-up for StoryWeaver
+The Whisper model (or ASR worker pool), the audio decoder and the language
+model client are slow to import and load, so they are prepared on one
+background thread when the app starts instead of before the first page
+renders. Code that needs one of them waits for just that component, and
+`status()` feeds the readiness indicator in the sidebar.
+"""
+
+import io
+import logging
+import threading
+import time
+import wave
+from concurrent.futures import Future
+
+import asr
+import asr_service
+import audio
+import config
+import llm
+import tts
+
+logger = logging.getLogger(__name__)
+
+LABELS = {
+    'asr': "speech recognition",
+    'audio': "audio decoder",
+    'llm': "story writer",
+    'tts': "voice",
+}
+
+_warmup = None
+_warmup_lock = threading.Lock()
+
+
+def load_asr():
+    """The shared worker pool, or a Whisper model loaded once per process"""
+    if config.ASR_WORKERS > 0:
+        return asr_service.get_service()
+    if config.WHISPER_WARMUP:
+        return asr.warm_up()
+    return asr.get_model()
+
+
+def load_audio():
+    """Import the decoder and resampler by decoding a tenth of a second of silence"""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(b"\0\0" * 4410)
+    audio.decode_wav_bytes(buffer.getvalue())
+
+
+# In the order they are needed: the child speaks first, then the story is written
+LOADERS = {
+    'asr': load_asr,
+    'audio': load_audio,
+    'llm': llm.get_backend,
+    'tts': tts.get_cache,
+}
+
+
+class Warmup:
+    """Runs every loader once on a daemon thread and hands out the results"""
+
+    def __init__(self, loaders=None):
+        self.loaders = dict(loaders or LOADERS)
+        self._futures = {name: Future() for name in self.loaders}
+        self._status = {name: {'state': "waiting", 'seconds': None, 'error': None} for name in self.loaders}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+        self._thread.start()
+
+    def result(self, name, timeout=None):
+        """Wait for component `name` and return it; re-raises its load error"""
+        return self._futures[name].result(timeout)
+
+    def ready(self, name=None):
+        """True once `name` (or every component) has finished loading, successfully or not"""
+        names = [name] if name is not None else list(self._futures)
+        return all(self._futures[n].done() for n in names)
+
+    def status(self):
+        """Per component: state (waiting/loading/ready/failed), load seconds and error"""
+        with self._lock:
+            return {name: dict(info) for name, info in self._status.items()}
+
+    def _run(self):
+        for name, loader in self.loaders.items():
+            self._update(name, state="loading")
+            start = time.perf_counter()
+            try:
+                value = loader()
+            except Exception as e:
+                logger.exception("Warm-up of %s failed", name)
+                self._update(name, state="failed", seconds=time.perf_counter() - start, error=str(e))
+                self._futures[name].set_exception(e)
+                continue
+            seconds = time.perf_counter() - start
+            self._update(name, state="ready", seconds=seconds)
+            self._futures[name].set_result(value)
+            logger.info("Warmed up %s in %.2fs", name, seconds)
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self._status[name].update(fields)
+
+
+def get_warmup():
+    """Return the process-wide warm-up, starting it on first use"""
+    global _warmup
+    if _warmup is None:
+        with _warmup_lock:
+            if _warmup is None:
+                _warmup = Warmup()
+    return _warmup
@@ -0,0 +1,261 @@
+"""
+Latency telemetry for StoryWeaver
+Times each stage of a session (audio decoding, transcription, the language
+model calls, text-to-speech, scoring, saving progress) as a span tagged with
+the session id. Finished spans are appended to a JSON-lines metrics file and
+kept in a bounded in-memory window from which p50/p95/p99 are computed for
+the admin page and an optional Prometheus text endpoint. Spans slower than
+TELEMETRY_SLOW_SECONDS are logged with their attributes (audio length,
+transcript length) so latency can be related to input size.
+"""
+
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+import config
+
+logger = logging.getLogger(__name__)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_telemetry = None
+_telemetry_lock = threading.Lock()
+_session_id = contextvars.ContextVar("storyweaver_session_id", default=None)
+
+
+class Span:
+    """One timed stage; attributes can be added while it is open"""
+
+    def __init__(self, stage, session_id, attributes):
+        self.stage = stage
+        self.session_id = session_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.started = time.time()
+        self.seconds = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def record(self):
+        return {
+            'stage': self.stage,
+            'session_id': self.session_id,
+            'start': self.started,
+            'seconds': self.seconds,
+            'status': self.status,
+            **self.attributes,
+        }
+
+
+class Telemetry:
+    """Collects spans, writes them to the metrics file and summarises them"""
+
+    def __init__(self, path=None, window=None, slow_seconds=None, max_file_bytes=None, enabled=None):
+        self.enabled = enabled if enabled is not None else config.TELEMETRY_ENABLED
+        self.path = path if path is not None else config.TELEMETRY_FILE
+        self.window = window or config.TELEMETRY_WINDOW
+        self.slow_seconds = slow_seconds if slow_seconds is not None else config.TELEMETRY_SLOW_SECONDS
+        self.max_file_bytes = (max_file_bytes if max_file_bytes is not None
+                               else config.TELEMETRY_FILE_MAX_MB * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self._recent = defaultdict(lambda: deque(maxlen=self.window))
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(float)
+        self._errors = defaultdict(int)
+        self._slowest = deque(maxlen=50)
+
+    @contextmanager
+    def span(self, stage, session_id=None, **attributes):
+        """Time the enclosed block as `stage`; yields the Span so attributes can be added"""
+        span = Span(stage, session_id or _session_id.get(), attributes)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            # st.stop() and st.rerun() unwind with exceptions too; only real failures count
+            if isinstance(e, Exception) and type(e).__module__.split(".")[0] != "streamlit":
+                span.status = "error"
+                span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.seconds = time.perf_counter() - start
+            self.add(span)
+
+    def add(self, span):
+        if not self.enabled:
+            return
+        record = span.record()
+        with self._lock:
+            self._recent[span.stage].append(span.seconds)
+            self._counts[span.stage] += 1
+            self._totals[span.stage] += span.seconds
+            if span.status != "ok":
+                self._errors[span.stage] += 1
+            if span.seconds >= self.slow_seconds:
+                self._slowest.append(record)
+            self._write(record)
+
+        if span.seconds >= self.slow_seconds:
+            details = " ".join(f"{key}={value}" for key, value in span.attributes.items())
+            logger.warning("Slow %s: %.2fs session=%s %s", span.stage, span.seconds, span.session_id, details)
+
+    def summary(self):
+        """Per-stage count, mean and p50/p95/p99 over the in-memory window"""
+        with self._lock:
+            stages = {stage: list(values) for stage, values in self._recent.items()}
+            counts, totals, errors = dict(self._counts), dict(self._totals), dict(self._errors)
+        return {
+            stage: {
+                'count': counts[stage],
+                'errors': errors.get(stage, 0),
+                'mean': totals[stage] / counts[stage],
+                **{f"p{int(q * 100)}": value for q, value in zip(QUANTILES, percentiles(values, QUANTILES))},
+            }
+            for stage, values in sorted(stages.items())
+        }
+
+    def slow_spans(self):
+        """Most recent spans that crossed the slow threshold, newest first"""
+        with self._lock:
+            return list(reversed(self._slowest))
+
+    def prometheus_text(self):
+        """Render the summary in the Prometheus text exposition format"""
+        lines = [
+            "# HELP storyweaver_stage_seconds Latency of each session stage",
+            "# TYPE storyweaver_stage_seconds summary",
+        ]
+        summary = self.summary()
+        for stage, stats in summary.items():
+            for q in QUANTILES:
+                lines.append(f'storyweaver_stage_seconds{{stage="{stage}",quantile="{q}"}} {stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'storyweaver_stage_seconds_sum{{stage="{stage}"}} {stats["mean"] * stats["count"]:.6f}')
+            lines.append(f'storyweaver_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines += [
+            "# HELP storyweaver_stage_errors_total Stages that raised an error",
+            "# TYPE storyweaver_stage_errors_total counter",
+        ]
+        for stage, stats in summary.items():
+            lines.append(f'storyweaver_stage_errors_total{{stage="{stage}"}} {stats["errors"]}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="0.0.0.0"):
+        """Serve `prometheus_text()` at http://host:port/metrics from a daemon thread"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        telemetry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Serving Prometheus metrics on port %d", port)
+        return server
+
+    def _write(self, record):
+        if not self.path:
+            return
+        try:
+            if self.max_file_bytes > 0 and os.path.getsize(self.path) > self.max_file_bytes:
+                os.replace(self.path, f"{self.path}.1")
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            logger.warning("Could not write metrics to %s: %s", self.path, e)
+
+
+def percentiles(values, quantiles=QUANTILES):
+    """Nearest-rank percentiles of `values`"""
+    if not values:
+        return [0.0 for _ in quantiles]
+    ordered = sorted(values)
+    return [ordered[max(0, math.ceil(q * len(ordered)) - 1)] for q in quantiles]
+
+
+def set_session(session_id):
+    """Tag spans opened in this thread (and contexts copied from it) with `session_id`"""
+    _session_id.set(session_id)
+
+
+def span(stage, **attributes):
+    """Shortcut for `get_telemetry().span(...)`"""
+    return get_telemetry().span(stage, **attributes)
+
+
+def load_records(path):
+    """Yield span records from a metrics file, skipping damaged lines"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def replay(path, slow_seconds=None):
+    """Build a collector holding every span from a metrics file"""
+    collector = Telemetry(path="", window=1_000_000, slow_seconds=slow_seconds, enabled=True)
+    passthrough = ('stage', 'session_id', 'start', 'seconds', 'status')
+    for record in load_records(path):
+        span = Span(record['stage'], record.get('session_id'),
+                    {key: value for key, value in record.items() if key not in passthrough})
+        span.started, span.seconds, span.status = record.get('start'), record['seconds'], record.get('status', "ok")
+        collector.add(span)
+    return collector
+
+
+def get_telemetry():
+    """Return the process-wide telemetry collector, starting the metrics endpoint if configured"""
+    global _telemetry
+    if _telemetry is None:
+        with _telemetry_lock:
+            if _telemetry is None:
+                telemetry = Telemetry()
+                if telemetry.enabled and config.TELEMETRY_PORT:
+                    try:
+                        telemetry.serve(config.TELEMETRY_PORT)
+                    except OSError as e:
+                        logger.warning("Could not start the metrics endpoint: %s", e)
+                _telemetry = telemetry
+    return _telemetry
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Summarise stage latencies from a metrics file")
+    parser.add_argument("path", nargs="?", default=None, help="Metrics file (default: config.TELEMETRY_FILE)")
+    parser.add_argument("--prometheus", action="store_true", help="Print in Prometheus text format")
+    args = parser.parse_args()
+
+    collector = replay(args.path or config.TELEMETRY_FILE, slow_seconds=float("inf"))
+
+    if args.prometheus:
+        print(collector.prometheus_text(), end="")
+    else:
+        print(json.dumps(collector.summary(), indent=2))
@@ -0,0 +1,85 @@
+"""
+Checks the bit-parallel word alignment in scoring.py against a plain
+edit-distance table with the same tie-breaking
+
+Usage:
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scoring
+
+WORDS = "the a dog cat ran runs fast big red ball is on it and".split()
+
+
+def reference_align(ref_words, spoken_words):
+    """Full (n+1) x (m+1) table and backtrace, preferring match, deletion, insertion, substitution"""
+    table = [list(range(len(spoken_words) + 1))]
+    for i, ref_word in enumerate(ref_words, 1):
+        row = [i]
+        for j, spoken_word in enumerate(spoken_words, 1):
+            row.append(min(table[-1][j] + 1, row[j - 1] + 1, table[-1][j - 1] + (ref_word != spoken_word)))
+        table.append(row)
+
+    alignment = []
+    i, j = len(ref_words), len(spoken_words)
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and ref_words[i - 1] == spoken_words[j - 1] and table[i][j] == table[i - 1][j - 1]:
+            alignment.append({'op': "match", 'reference': ref_words[i - 1], 'spoken': spoken_words[j - 1]})
+            i, j = i - 1, j - 1
+        elif i > 0 and table[i][j] == table[i - 1][j] + 1:
+            alignment.append({'op': "deletion", 'reference': ref_words[i - 1], 'spoken': None})
+            i -= 1
+        elif j > 0 and table[i][j] == table[i][j - 1] + 1:
+            alignment.append({'op': "insertion", 'reference': None, 'spoken': spoken_words[j - 1]})
+            j -= 1
+        else:
+            alignment.append({'op': "substitution", 'reference': ref_words[i - 1], 'spoken': spoken_words[j - 1]})
+            i, j = i - 1, j - 1
+    alignment.reverse()
+    return alignment, table[-1][-1]
+
+
+def check(ref_words, spoken_words):
+    expected, distance = reference_align(ref_words, spoken_words)
+    alignment = scoring._align(ref_words, spoken_words)
+    assert alignment == expected
+    assert sum(step['op'] != "match" for step in alignment) == distance
+
+
+def test_empty_inputs():
+    check([], [])
+    check(["the", "dog"], [])
+    check([], ["the", "dog"])
+    assert scoring.score("", "")['accuracy'] == 100.0
+    assert scoring.score("the dog", "")['deletions'] == 2
+
+
+def test_identical_inputs():
+    words = [WORDS[i % len(WORDS)] for i in range(150)]
+    check(words, words)
+    assert scoring.score(" ".join(words), " ".join(words))['accuracy'] == 100.0
+
+
+def test_random_short_inputs():
+    rng = random.Random(0)
+    for _ in range(2000):
+        ref = [rng.choice(WORDS) for _ in range(rng.randint(0, 20))]
+        spoken = [rng.choice(WORDS) for _ in range(rng.randint(0, 20))]
+        check(ref, spoken)
+
+
+def test_inputs_longer_than_a_machine_word():
+    # Bit vectors over 64 and 128 spoken words need more than one machine word
+    rng = random.Random(1)
+    for length in (63, 64, 65, 127, 128, 129, 300):
+        ref = [rng.choice(WORDS) for _ in range(length)]
+        misread = [word if rng.random() > 0.2 else rng.choice(WORDS) for word in ref]
+        check(ref, misread)
+        check(ref, [rng.choice(WORDS) for _ in range(rng.randint(length // 2, length * 2))])
+        check(ref[:10], misread)
@@ -0,0 +1,292 @@
+"""
+Text-to-speech for StoryWeaver
+Serves story audio from a content-addressed, size-bounded LRU cache so
+repeated listens and identical sentences across sessions are synthesized
+only once. Synthesis itself is done by a pluggable backend (gTTS by default).
+"""
+
+import hashlib
+import io
+import logging
+import os
+import subprocess
+import threading
+import time
+import wave
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Eviction deletes down to this fraction of the size limit, so a full cache
+# is not rescanned on every write
+_EVICT_TO = 0.9
+
+
+class GTTSBackend:
+    """Google Translate TTS (needs network access)"""
+
+    name = "gtts"
+    extension = "mp3"
+    mime_type = "audio/mp3"
+
+    def synthesize(self, text, lang, slow):
+        from gtts import gTTS
+
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang, slow=slow).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class CommandBackend:
+    """Local synthesizer that writes a WAV to stdout, e.g. espeak-ng or piper
+
+    `command` is a format string; `{lang}` and `{speed}` are filled in and the
+    text is passed on stdin, so nothing needs shell quoting.
+    """
+
+    name = "command"
+    extension = "wav"
+    mime_type = "audio/wav"
+
+    def __init__(self, command=None):
+        self.command = command or config.TTS_COMMAND
+
+    def synthesize(self, text, lang, slow):
+        args = [part.format(lang=lang, speed=120 if slow else 160) for part in self.command.split()]
+        completed = subprocess.run(args, input=text.encode("utf-8"), capture_output=True, check=True, timeout=60)
+        return completed.stdout
+
+
+class FakeBackend:
+    """Offline stand-in that returns a silent WAV after a fixed delay
+
+    The clip is 60 ms per character, roughly the pace of slow speech, so
+    cache sizes and payloads stay realistic in benchmarks.
+    """
+
+    name = "fake"
+    extension = "wav"
+    mime_type = "audio/wav"
+
+    def __init__(self, latency=None, sample_rate=8000):
+        self.latency = latency if latency is not None else config.FAKE_TTS_LATENCY_MS / 1000
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text, lang, slow):
+        time.sleep(self.latency)
+        frames = int(len(text) * 0.06 * (1.5 if slow else 1) * self.sample_rate)
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(b"\0\0" * frames)
+        return buffer.getvalue()
+
+
+BACKENDS = {
+    "gtts": GTTSBackend,
+    "command": CommandBackend,
+    "fake": FakeBackend,
+}
+
+
+def register_backend(name, factory):
+    """Make a synthesizer available as config.TTS_BACKEND=`name`"""
+    BACKENDS[name] = factory
+
+
+class TTSCache:
+    """Content-addressed audio cache on disk with an in-memory front
+
+    Entries are keyed by a hash of (backend, text, lang, slow). Files live in
+    `directory` and are evicted least-recently-used once their total size
+    passes `max_bytes`; recently used audio is also kept in memory (up to
+    `memory_bytes`) so `st.audio` can be fed bytes without touching disk.
+    The directory is only listed when a running total of its size passes
+    `max_bytes`; each listing also corrects the total for files written or
+    removed by other processes.
+    """
+
+    def __init__(self, backend=None, directory=None, max_bytes=None, memory_bytes=None, prefetch_workers=None):
+        self.backend = backend or BACKENDS[config.TTS_BACKEND]()
+        self.directory = directory or config.TTS_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else config.TTS_CACHE_MAX_MB * 1024 * 1024
+        self.memory_bytes = memory_bytes if memory_bytes is not None else config.TTS_MEMORY_CACHE_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = None
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=prefetch_workers or config.TTS_PREFETCH_WORKERS,
+            thread_name_prefix="tts-prefetch",
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, text, lang="en", slow=False):
+        payload = "\0".join([self.backend.name, lang, "slow" if slow else "normal", text.strip()])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, text, lang="en", slow=False):
+        """Return the audio bytes for `text`, synthesizing them on a miss"""
+        key = self.key(text, lang, slow)
+
+        path = self._path(key)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+            else:
+                # Another caller (usually prefetch) is already synthesizing this text
+                pending = self._inflight.get(key)
+
+        if data is not None:
+            # Disk eviction goes by mtime, so memory hits must count as uses too
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return data
+        if pending is not None:
+            return pending.result()
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+        except FileNotFoundError:
+            data = self._synthesize(key, text, lang, slow)
+
+        self._remember(key, data)
+        return data
+
+    def prefetch(self, texts, lang="en", slow=False):
+        """Synthesize `texts` in the background; returns the list of futures"""
+        futures = []
+        for text in texts:
+            if text and text.strip():
+                future = self._executor.submit(self.get, text, lang, slow)
+                future.add_done_callback(_log_prefetch_failure)
+                futures.append(future)
+        return futures
+
+    def stats(self):
+        """Return hit/miss counters and current cache sizes"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_size,
+                'disk_bytes': sum(size for _, size, _ in self._disk_entries()),
+            }
+
+    def _synthesize(self, key, text, lang, slow):
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return pending.result()
+
+        try:
+            data = self.backend.synthesize(text, lang, slow)
+            self._write(key, data)
+            with self._lock:
+                self.misses += 1
+            pending.set_result(data)
+            return data
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _write(self, key, data):
+        # Write-then-rename so other processes never read a half-written file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._disk_size is not None:
+                self._disk_size += len(data)
+            full = self._disk_size is None or self._disk_size > self.max_bytes
+        if full:
+            self._evict()
+
+    def _evict(self):
+        with self._evict_lock:
+            entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                for path, size, _ in entries:
+                    if total <= self.max_bytes * _EVICT_TO:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                    except FileNotFoundError:
+                        pass
+            with self._lock:
+                self._disk_size = total
+
+    def _disk_entries(self):
+        entries = []
+        suffix = f".{self.backend.extension}"
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(suffix):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = data
+            self._memory_size += len(data)
+            while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_size -= len(evicted)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.{self.backend.extension}")
+
+
+def _log_prefetch_failure(future):
+    if future.exception() is not None:
+        logger.warning("TTS prefetch failed: %s", future.exception())
+
+
+def get_cache():
+    """Return the process-wide TTS cache shared by all sessions"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TTSCache()
+    return _cache